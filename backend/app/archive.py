@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Column, Index, MetaData, Table, and_, delete, func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import aliased
+from . import changes, events
+from .database import BACKEND, SQLALCHEMY_DATABASE_URL, dialect_insert, engine
+from .models import ArchivedMonth, DailyLog, Document
+from .pagination import decode_cursor, encode_cursor, paginate
+
+# Hot/cold split for the tables that only ever grow. Whole months older than
+# ARCHIVE_AFTER_DAYS are moved out of daily_logs and documents into one SQLite
+# file per month (ARCHIVE_DIR/<db name>-YYYY-MM.db), listed in the
+# archive_months catalog. The hot tables, their indexes and the page cache then
+# only cover the current phase of the build, and VACUUM/backups of the main
+# file stay short; archive files never change once their month is closed.
+#
+# Reads attach an archive file to the request's own connection
+# (ATTACH DATABASE) only when they reach back into its month: GET /logs/ with
+# an old enough `from`, exports (every month unless from/to exclude it) and
+# lookups of a document by id. Analytics read daily_log_rollups, which are
+# never archived. Archived rows are read-only, drop out of full-text search
+# and are not sent by /sync (clients keep the copies they have); include= on
+# them only finds related rows that are still hot.
+#
+#     python -m app.archive [--before YYYY-MM-DD] [--dry-run] [--vacuum]
+#     python -m app.archive stats
+#
+# or set ARCHIVE_INTERVAL_HOURS to run it from the app. SQLite only.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(make_url(SQLALCHEMY_DATABASE_URL).database or "."), "archive"
+)
+# Rows per copy/delete transaction, so the write lock is never held for long
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", 5000))
+# 0: archive only when the CLI (e.g. from cron) runs
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", 0))
+ARCHIVE_SCHEMA = "archive"
+
+# table -> (model, column whose month decides where a row lives)
+ARCHIVED = {"daily_logs": (DailyLog, "date"), "documents": (Document, "created_at")}
+
+log = logging.getLogger("app.archive")
+
+_metadata = MetaData()
+
+def _archive_table(table: Table) -> Table:
+    # Same columns and indexes, no foreign keys: the referenced rows live in the main database
+    archived = Table(table.name, _metadata, *(Column(c.name, c.type, primary_key=c.primary_key) for c in table.columns), schema=ARCHIVE_SCHEMA)
+    for index in table.indexes:
+        Index(index.name, *(archived.c[c.name] for c in index.columns))
+    return archived
+
+ARCHIVE_TABLES = {name: _archive_table(model.__table__) for name, (model, _) in ARCHIVED.items()}
+# The ORM models mapped onto the attached tables: queries, projections and include= work unchanged
+ARCHIVE_MODELS = {name: aliased(model, ARCHIVE_TABLES[name], adapt_on_names=True) for name, (model, _) in ARCHIVED.items()}
+
+def archive_supported() -> bool:
+    return BACKEND == "sqlite"
+
+def month_bounds(month: str) -> tuple:
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def file_name(month: str) -> str:
+    stem = os.path.splitext(os.path.basename(make_url(SQLALCHEMY_DATABASE_URL).database or "pvdb"))[0]
+    return f"{stem}-{month}.db"
+
+def _path(name: str) -> str:
+    return os.path.join(ARCHIVE_DIR, name)
+
+# Reads (request handlers)
+
+async def archived_months(db, table: str, date_from: date = None, date_to: date = None) -> list:
+    """Catalog rows for the archived months of `table` overlapping the range, oldest first."""
+    if not archive_supported():
+        return []
+    stmt = select(ArchivedMonth).where(ArchivedMonth.table_name == table).order_by(ArchivedMonth.month)
+    if date_from is not None:
+        stmt = stmt.where(ArchivedMonth.month >= date_from.strftime("%Y-%m"))
+    if date_to is not None:
+        stmt = stmt.where(ArchivedMonth.month <= date_to.strftime("%Y-%m"))
+    return (await db.scalars(stmt)).all()
+
+@asynccontextmanager
+async def attached(db, month: ArchivedMonth):
+    """Attach one month's archive to the session's connection; yields the archived model.
+
+    One month at a time: SQLite allows only a handful of attached databases
+    per connection. Results must be fully fetched before the block ends.
+    """
+    path = _path(month.file_name)
+    if not os.path.isfile(path):
+        # ATTACH would silently create an empty database
+        raise RuntimeError(f"Archive file missing: {path}")
+    await db.execute(text(f"ATTACH DATABASE :path AS {ARCHIVE_SCHEMA}"), {"path": path})
+    try:
+        yield ARCHIVE_MODELS[month.table_name]
+    finally:
+        try:
+            await db.execute(text(f"DETACH DATABASE {ARCHIVE_SCHEMA}"))
+        except Exception:
+            # Still in use: discard the connection rather than return it to the pool attached
+            await (await db.connection()).invalidate()
+
+async def paginate_archived(db, table: str, stmt_for, columns, cursor: str = None, skip: int = 0, limit: int = 100, scalars: bool = True, date_from: date = None, date_to: date = None):
+    """paginate() across the hot table and the archived months in range.
+
+    stmt_for(model) builds the query for the hot model or an archived one;
+    `columns` names the sort key, date column first. Archives are only read
+    when date_from reaches back into them, so pages of the current phase cost
+    one catalog lookup at most.
+    """
+    model = ARCHIVED[table][0]
+    months = await archived_months(db, table, date_from, date_to) if date_from is not None else []
+    if not months:
+        return await paginate(db, stmt_for(model), [getattr(model, c) for c in columns], cursor, skip, limit, scalars=scalars)
+
+    # Merge the first skip + limit rows of each source; archived months are
+    # disjoint and in date order, so later ones are only read while rows are missing
+    wanted = limit if cursor else skip + limit
+    after = decode_cursor(cursor, [getattr(model, c) for c in columns])[0] if cursor else None
+    rows, _ = await paginate(db, stmt_for(model), [getattr(model, c) for c in columns], cursor, 0, wanted, scalars=scalars)
+    archived = []
+    for month in months:
+        if len(archived) >= wanted:
+            break
+        if after is not None and month_bounds(month.month)[1] <= after:
+            continue
+        async with attached(db, month) as archived_model:
+            part, _ = await paginate(db, stmt_for(archived_model), [getattr(archived_model, c) for c in columns], cursor, 0, wanted - len(archived), scalars=scalars)
+            archived += part
+    merged = sorted(rows + archived, key=lambda row: tuple(getattr(row, c) for c in columns))
+    page = merged[0 if cursor else skip:][:limit]
+    next_cursor = encode_cursor([getattr(page[-1], c) for c in columns]) if len(page) == limit else None
+    return page, next_cursor
+
+async def find_archived(db, table: str, row_id: int, query):
+    """Look a row up by id in the archives; `query(model)` is awaited per candidate month."""
+    if not archive_supported():
+        return None
+    months = (await db.scalars(select(ArchivedMonth).where(
+        ArchivedMonth.table_name == table, ArchivedMonth.min_id <= row_id, ArchivedMonth.max_id >= row_id
+    ).order_by(ArchivedMonth.month))).all()
+    for month in months:
+        async with attached(db, month) as archived_model:
+            row = await query(archived_model)
+        if row is not None:
+            return row
+    return None
+
+# Archiving (CLI or scheduled job)
+
+def _in_transaction(conn, stmt):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        conn.execute(stmt)
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+def _move_month(conn, table: str, month: str) -> int:
+    hot, archived = ARCHIVED[table][0].__table__, ARCHIVE_TABLES[table]
+    start, end = month_bounds(month)
+    date_column = hot.c[ARCHIVED[table][1]]
+    in_month = and_(date_column >= start, date_column < end)
+    name = file_name(month)
+    conn.execute(text(f"ATTACH DATABASE :path AS {ARCHIVE_SCHEMA}"), {"path": _path(name)})
+    try:
+        _metadata.create_all(conn, tables=[archived], checkfirst=True)
+        moved, last_id = 0, 0
+        while True:
+            ids = conn.execute(select(hot.c.id).where(in_month, hot.c.id > last_id).order_by(hot.c.id).limit(ARCHIVE_BATCH_ROWS)).scalars().all()
+            if not ids:
+                break
+            chunk = and_(in_month, hot.c.id.between(ids[0], ids[-1]))
+            # Two commits, copy first: in WAL mode SQLite does not commit attached
+            # databases atomically, and this order can only leave a duplicate
+            # behind (cleared on the next run), never lose a row
+            columns = [c.name for c in hot.columns]
+            _in_transaction(conn, archived.insert().prefix_with("OR IGNORE").from_select(columns, select(*hot.c).where(chunk)))
+            _in_transaction(conn, delete(hot).where(chunk, hot.c.id.in_(select(archived.c.id).where(archived.c.id.between(ids[0], ids[-1])))))
+            moved += len(ids)
+            last_id = ids[-1]
+        row_count, min_id, max_id = conn.execute(select(func.count(), func.min(archived.c.id), func.max(archived.c.id))).one()
+        values = {"file_name": name, "row_count": row_count, "min_id": min_id, "max_id": max_id, "archived_at": datetime.utcnow()}
+        _in_transaction(conn, dialect_insert(ArchivedMonth).values(table_name=table, month=month, **values).on_conflict_do_update(
+            index_elements=["table_name", "month"], set_=values
+        ))
+    finally:
+        conn.execute(text(f"DETACH DATABASE {ARCHIVE_SCHEMA}"))
+    return moved
+
+def archive_old_rows(before: date = None, dry_run: bool = False) -> list:
+    """Move whole months before `before` (default: ARCHIVE_AFTER_DAYS ago) out of the hot tables.
+
+    Returns [(table, month, rows)]: rows moved, or rows that would move with dry_run.
+    Safe to rerun or to run from several workers at once.
+    """
+    if not archive_supported():
+        raise RuntimeError("Archiving requires SQLite")
+    before = before or date.today() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    cutoff = datetime(before.year, before.month, 1)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    results = []
+    # Autocommit: ATTACH is not allowed inside a transaction, so transactions are opened by hand
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table, (model, date_key) in ARCHIVED.items():
+            date_column = model.__table__.c[date_key]
+            month = func.strftime("%Y-%m", date_column)
+            pending = conn.execute(select(month, func.count()).where(date_column < cutoff).group_by(month).order_by(month)).all()
+            for name, count in pending:
+                results.append((table, name, count if dry_run else _move_month(conn, table, name)))
+        if results and not dry_run:
+            tables = {table for table, _, _ in results}
+            # Running workers (this may be a separate CLI process) expire their
+            # ETags and caches when they read this record from the event feed
+            events.write_record(conn, tables, [{"resource": events.RESOURCES[table][0], "action": "changed"} for table in sorted(tables)])
+            changes.bump(*tables)
+    return results
+
+def vacuum():
+    # Returns the space freed by archiving to the filesystem; needs a moment with no writers
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+
+def stats() -> dict:
+    """Hot row counts and file size next to what is archived, per table."""
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        result = {
+            "hot_file_bytes": conn.exec_driver_sql("PRAGMA page_count").scalar() * page_size,
+            "hot_free_bytes": conn.exec_driver_sql("PRAGMA freelist_count").scalar() * page_size,
+            "tables": {},
+        }
+        for table, (model, date_key) in ARCHIVED.items():
+            date_column = model.__table__.c[date_key]
+            hot_rows, oldest = conn.execute(select(func.count(), func.min(date_column))).one()
+            months = conn.execute(select(ArchivedMonth).where(ArchivedMonth.table_name == table).order_by(ArchivedMonth.month)).all()
+            result["tables"][table] = {
+                "hot_rows": hot_rows,
+                "hot_oldest": oldest.isoformat() if oldest else None,
+                "archived_rows": sum(m.row_count for m in months),
+                "archived_months": {
+                    m.month: {"rows": m.row_count, "file": m.file_name, "bytes": os.path.getsize(_path(m.file_name)) if os.path.isfile(_path(m.file_name)) else None}
+                    for m in months
+                },
+            }
+    return result
+
+# Scheduled job (ARCHIVE_INTERVAL_HOURS > 0)
+
+_task = None
+
+async def _run_periodically():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+        try:
+            for table, month, rows in await run_in_threadpool(archive_old_rows):
+                log.info("Archived %s rows of %s from %s", rows, table, month)
+        except Exception:
+            log.exception("Archiving failed; retrying at the next interval")
+
+def start():
+    global _task
+    if ARCHIVE_INTERVAL_HOURS > 0 and archive_supported() and _task is None:
+        _task = asyncio.create_task(_run_periodically())
+
+def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+if __name__ == "__main__":
+    from .migrations import migrate
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Move old daily logs and documents into per-month archive databases")
+    parser.add_argument("command", nargs="?", choices=["run", "stats"], default="run")
+    parser.add_argument("--before", type=date.fromisoformat, help=f"archive whole months before this date (default: {ARCHIVE_AFTER_DAYS} days ago)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the main database afterwards to shrink the file")
+    args = parser.parse_args()
+    if not archive_supported():
+        parser.exit(1, "Archiving requires SQLite\n")
+    migrate()
+    if args.command == "stats":
+        print(json.dumps(stats(), indent=2))
+    else:
+        results = archive_old_rows(args.before, args.dry_run)
+        for table, month, rows in results:
+            print(f"{table} {month}: {rows} rows{' to archive' if args.dry_run else ' archived'}")
+        if not results:
+            print("Nothing to archive")
+        if args.vacuum and not args.dry_run:
+            vacuum()
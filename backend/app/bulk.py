@@ -0,0 +1,102 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import IdempotencyKey
+
+# Helpers shared by the bulk ingestion endpoints used for offline tablet sync
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 5000))
+# Bodies are parsed in memory, so their size is capped before they are read in full
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", 16 * 1024 * 1024))
+IDEMPOTENCY_TTL = timedelta(days=int(os.getenv("IDEMPOTENCY_TTL_DAYS", 7)))
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Body exceeds {BULK_MAX_BYTES} bytes")
+
+async def _read_body(request: Request) -> bytes:
+    # Refused up front when the client declares the size, and cut off while
+    # streaming otherwise (chunked uploads carry no Content-Length)
+    if int(request.headers.get("content-length") or 0) > BULK_MAX_BYTES:
+        raise _too_large()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BULK_MAX_BYTES:
+            raise _too_large()
+    return bytes(body)
+
+async def read_items(request: Request) -> list:
+    """Parse a JSON array (or {"items": [...]}) or an NDJSON body into raw items.
+
+    Unparseable NDJSON lines become ValueError placeholders so they can be
+    reported per item instead of failing the whole batch.
+    """
+    body = await _read_body(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        items = []
+        for line in body.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError as e:
+                    items.append(ValueError(f"Invalid JSON: {e}"))
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+        if isinstance(items, dict):
+            items = items.get("items")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    return items
+
+def validate_item(schema, raw):
+    """Return (model, None) or (None, errors) for one raw bulk item."""
+    if isinstance(raw, ValueError):
+        return None, [{"loc": [], "msg": str(raw)}]
+    if not isinstance(raw, dict):
+        return None, [{"loc": [], "msg": "Item must be a JSON object"}]
+    try:
+        return schema(**raw), None
+    except ValidationError as e:
+        return None, [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+
+def summarize(results: list) -> dict:
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return {**counts, "results": results}
+
+async def get_replay(db: AsyncSession, user_id: int, endpoint: str, key: Optional[str]):
+    if not key:
+        return None
+    stored = await db.scalar(select(IdempotencyKey.response).where(
+        IdempotencyKey.user_id == user_id, IdempotencyKey.endpoint == endpoint, IdempotencyKey.key == key
+    ))
+    return json.loads(stored) if stored is not None else None
+
+async def commit_with_key(db: AsyncSession, user_id: int, endpoint: str, key: Optional[str], response: dict) -> dict:
+    """Commit the batch together with its idempotency key; returns the response to send."""
+    if key:
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL))
+        db.add(IdempotencyKey(key=key, endpoint=endpoint, user_id=user_id, response=json.dumps(response, default=str)))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key committed first; discard ours and replay theirs
+        await db.rollback()
+        replay = await get_replay(db, user_id, endpoint, key)
+        if replay is None:
+            raise
+        return replay
+    return response
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Per-table change versions. Every committed session that wrote to a table bumps
+# that table's counter, so caches can validate themselves by comparing versions
+# instead of re-running queries. Writes that bypass the ORM session (raw
+# connections, other processes) must call bump() themselves.
+
+_versions = defaultdict(int)
+# True while an event broker relays other processes' commits to bump(); until
+# then the versions only cover this process's own writes
+relayed = False
+_listeners = []
+_commit_listeners = []
+
+def versions(tables) -> tuple:
+    return tuple(_versions[table] for table in tables)
+
+def on_change(callback):
+    """Register callback(tables: set) to run after a commit touched those tables."""
+    _listeners.append(callback)
+    return callback
+
+def on_local_commit(callback):
+    """Register callback(session, tables: set) to run after a commit in this process.
+
+    Unlike on_change it does not fire for bump() calls, e.g. changes relayed
+    from other worker processes.
+    """
+    _commit_listeners.append(callback)
+    return callback
+
+def pending_tables(session) -> set:
+    """Tables written so far in the session's current transaction."""
+    return set(_pending(session))
+
+def bump(*tables):
+    for table in tables:
+        _versions[table] += 1
+    for callback in _listeners:
+        callback(set(tables))
+
+def _pending(session) -> set:
+    return session.info.setdefault("changed_tables", set())
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            _pending(session).add(table)
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statements(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements never reach the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _pending(session=orm_execute_state.session).add(table.name)
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        bump(*tables)
+        for callback in _commit_listeners:
+            callback(session, tables)
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("changed_tables", None)
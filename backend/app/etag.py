@@ -0,0 +1,55 @@
+import hashlib
+import os
+import time
+import uuid
+from fastapi import Depends, HTTPException, Request, Response, status
+from . import changes
+from .changes import versions
+from .routers.auth import get_current_user
+
+# Conditional GET for read endpoints. The ETag is derived from the change
+# versions of the tables a response is built from (plus the caller and the
+# URL), so an unchanged poll is answered with 304 before the handler, and its
+# queries, run at all.
+
+# Versions are per process; tagging ETags with this process's identity keeps
+# one worker from confirming an ETag issued against another worker's counters
+INSTANCE_ID = uuid.uuid4().hex[:8]
+# Worker processes; uvicorn and gunicorn both default --workers to this
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+# Ask browsers to revalidate every time rather than reuse a stale copy
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def versions_shared() -> bool:
+    # A single worker sees every write; several only see each other's while the
+    # database event broker relays them (events.py). Otherwise a worker would
+    # keep confirming ETags for data another worker has since changed.
+    return WEB_CONCURRENCY <= 1 or changes.relayed
+
+def conditional(*tables, clock_seconds: int = 0):
+    """Dependency issuing a weak ETag for responses built from `tables`.
+
+    clock_seconds > 0 also rolls the ETag over at that interval, for responses
+    that depend on the current time as well as on the data. No ETag is issued
+    while versions are not shared between workers (see versions_shared).
+    """
+    async def check(request: Request, response: Response, current_user = Depends(get_current_user)):
+        if not versions_shared():
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+            return
+        parts = [INSTANCE_ID, versions(tables), current_user.id, current_user.role, request.url.path, request.url.query]
+        if clock_seconds:
+            parts.append(int(time.time() // clock_seconds))
+        etag = 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if not_modified(request, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+    return check
@@ -0,0 +1,325 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import date, datetime
+from sqlalchemy import delete, event, func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+from . import changes
+from .database import async_engine
+from .etag import INSTANCE_ID, WEB_CONCURRENCY
+from .models import EventRecord
+
+# Change feed behind GET /events. Every committed transaction that touched the
+# tables in RESOURCES becomes one record: the rows created/updated/deleted,
+# plus a table-level "changed" entry for bulk statements that carry no row
+# ids. Records are numbered and fanned out to the open SSE connections of the
+# process by the EventBus; a broker decides where numbers come from and how
+# records reach other worker processes:
+#
+# - memory (default with one worker): in-process only, numbered per process.
+# - database: each record is written to the events table inside the
+#   committing transaction and every worker polls the table, so all workers
+#   stream the same numbered feed and invalidate their ETag versions and
+#   caches on each other's writes.
+#
+# The database broker is the default when WEB_CONCURRENCY > 1. Running several
+# workers on the memory broker also works, but conditional GETs are then
+# switched off (etag.py), since no worker would hear of another's writes.
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "database" if WEB_CONCURRENCY > 1 else "memory")
+# Records kept for Last-Event-ID resume (memory) / rows kept in the events table (database)
+EVENTS_REPLAY = int(os.getenv("EVENTS_REPLAY", 1000))
+EVENTS_RETENTION = int(os.getenv("EVENTS_RETENTION", 10000))
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", 0.5))
+# How often the memory broker looks for records written by other processes
+# (python -m app.archive); the database broker picks them up as it polls
+EVENTS_EXTERNAL_POLL_SECONDS = float(os.getenv("EVENTS_EXTERNAL_POLL_SECONDS", 5))
+# Comment lines sent on idle streams so proxies don't close them
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+# Records buffered per connection; a client that falls further behind is told to reload
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 256))
+# Arbitrary constant: serialises event-row commits on PostgreSQL so ids become visible in order
+PG_EVENTS_LOCK = 560_022
+
+# table -> (resource, owner column, fields sent with every change). Changes to
+# owned resources reach Operators only for their own rows, as in the list endpoints.
+RESOURCES = {
+    "daily_logs": ("daily_log", "user_id", ["date", "workers_count", "hours_worked"]),
+    "materials": ("material", None, ["ddt_number", "batch_number", "non_conformity"]),
+    "project_progress": ("progress", None, ["kpi_name", "progress_percent", "target_date", "actual_date"]),
+    "documents": ("document", None, ["file_type", "material_id", "log_id"]),
+    "ocr_jobs": ("ocr_job", "user_id", ["status", "material_id"]),
+}
+OWNED_RESOURCES = {resource for resource, owner, _ in RESOURCES.values() if owner}
+
+# Queue markers: keep-alive tick, and "you missed records, reload"
+HEARTBEAT = object()
+RESET = object()
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _row_changes(session) -> list:
+    return session.info.setdefault("row_changes", [])
+
+def _describe(obj, action: str, spec) -> dict:
+    resource, owner, fields = spec
+    state = inspect(obj)
+    # Only already-loaded values: a lazy load here would cost a query per row
+    change = {"resource": resource, "action": action, "id": state.dict.get("id")}
+    if owner:
+        change["owner_id"] = state.dict.get(owner)
+    change["data"] = {field: state.dict[field] for field in fields if field in state.dict}
+    if action == "updated":
+        change["changed"] = [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+    return change
+
+@event.listens_for(Session, "after_flush")
+def _collect_rows(session, flush_context):
+    # new/dirty/deleted and attribute history still show the flushed changes here
+    for action, objects in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            spec = RESOURCES.get(getattr(obj, "__tablename__", None))
+            if spec is None or (action == "updated" and not session.is_modified(obj)):
+                continue
+            _row_changes(session).append(_describe(obj, action, spec))
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        spec = RESOURCES.get(getattr(table, "name", None))
+        if spec is not None:
+            change = {"resource": spec[0], "action": "changed"}
+            rows = _row_changes(orm_execute_state.session)
+            if change not in rows:
+                rows.append(change)
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("row_changes", None)
+
+def write_record(conn, tables: set, rows: list):
+    """Append a record to the events table, inside the transaction running on `conn`.
+
+    Writes made outside the app's sessions (python -m app.archive) call this
+    so running workers hear of them: both brokers read the table.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_EVENTS_LOCK})
+    conn.execute(insert(EventRecord.__table__).values(
+        origin=INSTANCE_ID,
+        payload=json.dumps({"tables": sorted(tables), "changes": rows}, default=json_default),
+        created_at=datetime.utcnow(),
+    ))
+
+async def fetch_records(after: int, limit: int) -> list:
+    async with async_engine.connect() as conn:
+        rows = (await conn.execute(
+            select(EventRecord.id, EventRecord.origin, EventRecord.payload)
+            .where(EventRecord.id > after).order_by(EventRecord.id).limit(limit)
+        )).all()
+    return [{"seq": seq, "origin": origin, **json.loads(payload)} for seq, origin, payload in rows]
+
+async def _last_record_id() -> int:
+    async with async_engine.connect() as conn:
+        return await conn.scalar(select(func.max(EventRecord.id))) or 0
+
+def visible_changes(record: dict, user) -> list:
+    if user.role != "Operator":
+        return record["changes"]
+    return [
+        change for change in record["changes"]
+        if change["resource"] not in OWNED_RESOURCES or change.get("owner_id") in (None, user.id)
+    ]
+
+class EventBus:
+    """Fans records out to the SSE connections of this process, one bounded queue each."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._heartbeat = None
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def deliver(self, record):
+        if not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._fan_out(record)
+        else:
+            # Committed from a worker thread (sync session)
+            self._loop.call_soon_threadsafe(self._fan_out, record)
+
+    def _fan_out(self, record):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+
+    async def _beat(self):
+        # One timer for every connection instead of a timeout per connection
+        while True:
+            await asyncio.sleep(EVENTS_HEARTBEAT_SECONDS)
+            self._fan_out(HEARTBEAT)
+
+    def start(self):
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._beat())
+
+    def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+class MemoryBroker:
+    """Single process: records are numbered here and fanned out on commit."""
+
+    # Numbers restart with the process, so resume ids carry the instance id
+    epoch = INSTANCE_ID
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._seq = 0
+        self._recent = deque(maxlen=EVENTS_REPLAY)
+        self._lock = threading.Lock()
+        self._external = 0
+        self._task = None
+
+    def publish(self, tables: set, rows: list):
+        with self._lock:
+            self._seq += 1
+            record = {"seq": self._seq, "tables": sorted(tables), "changes": rows}
+            self._recent.append(record)
+        self.bus.deliver(record)
+
+    async def replay(self, after: int):
+        """Records numbered above `after`, or None when some are no longer kept."""
+        oldest = self._recent[0]["seq"] if self._recent else self._seq + 1
+        if after > self._seq or after + 1 < oldest:
+            return None
+        return [record for record in list(self._recent) if record["seq"] > after]
+
+    async def _poll(self):
+        # This broker writes no records, so any in the table came from another process
+        while True:
+            await asyncio.sleep(EVENTS_EXTERNAL_POLL_SECONDS)
+            try:
+                for record in await fetch_records(self._external, 1000):
+                    self._external = record["seq"]
+                    if record["origin"] != INSTANCE_ID:
+                        changes.bump(*record["tables"])
+                    self.publish(set(record["tables"]), record["changes"])
+            except Exception:
+                # Database briefly unavailable: retry on the next round
+                pass
+
+    async def start(self):
+        self._external = await _last_record_id()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class DatabaseBroker:
+    """Several workers: records go through the events table, numbered by its id."""
+
+    epoch = "db"
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._last = 0
+        self._task = None
+
+    def write(self, session, tables: set, rows: list):
+        # Runs inside the committing transaction, so the record commits (or not) with the data
+        write_record(session.connection(), tables, rows)
+
+    def publish(self, tables: set, rows: list):
+        # Delivered by the poller, in the same order on every worker
+        pass
+
+    async def replay(self, after: int):
+        async with async_engine.connect() as conn:
+            oldest = await conn.scalar(select(func.min(EventRecord.id)))
+        if after > self._last or (oldest is not None and after + 1 < oldest):
+            return None
+        return await fetch_records(after, EVENTS_RETENTION)
+
+    async def _poll(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+            try:
+                for record in await fetch_records(self._last, 1000):
+                    self._last = record["seq"]
+                    if record["origin"] != INSTANCE_ID:
+                        # Another worker's write: expire this worker's ETags and caches too
+                        changes.bump(*record["tables"])
+                    self.bus.deliver(record)
+                polls += 1
+                if polls % 120 == 0:
+                    await self._prune()
+            except Exception:
+                # Database briefly unavailable: keep the feed alive and retry
+                await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    async def _prune(self):
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(EventRecord).where(EventRecord.id <= self._last - EVENTS_RETENTION))
+
+    async def start(self):
+        self._last = await _last_record_id()
+        self._task = asyncio.create_task(self._poll())
+        changes.relayed = True
+
+    async def stop(self):
+        changes.relayed = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+bus = EventBus()
+broker = DatabaseBroker(bus) if EVENTS_BROKER == "database" else MemoryBroker(bus)
+
+@event.listens_for(Session, "before_commit")
+def _write_record(session):
+    if not isinstance(broker, DatabaseBroker):
+        return
+    session.flush()
+    tables = changes.pending_tables(session)
+    if tables:
+        broker.write(session, tables, session.info.get("row_changes", []))
+
+@changes.on_local_commit
+def _publish(session, tables):
+    broker.publish(tables, session.info.pop("row_changes", []))
+
+async def start():
+    bus.start()
+    await broker.start()
+
+async def stop():
+    await broker.stop()
+    bus.stop()
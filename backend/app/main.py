@@ -1,34 +1,97 @@
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')  # Path fix
 
-from fastapi import FastAPI
+import inspect
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import Response
+from fastapi.routing import serialize_response
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
-from .models import Base
+from . import archive, events, metrics
+from .migrations import migrate
+from .ocr import shutdown_pool
+from .pagination import NEXT_CURSOR_HEADER
 from .routers.auth import router as auth_router
 from .routers.logs import router as logs_router
-from .routers.materials import router as materials_router
+from .routers.materials import router as materials_router, fail_interrupted_jobs, stop_ocr_jobs
 from .routers.progress import router as progress_router
 from .routers.documents import router as documents_router
+from .routers.dashboard import router as dashboard_router
+from .routers.search import router as search_router
+from .routers.export import router as export_router
+from .routers.events import router as events_router
+from .routers.sync import router as sync_router
 
-Base.metadata.create_all(bind=engine)
+# Set to 0 when migrations run as a separate deploy step (python -m app.migrations)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
 
-app = FastAPI(title="PV Site Manager API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker, after any fork: importing this module opens no
+    # database connections, threads or processes
+    if MIGRATE_ON_STARTUP:
+        migrate()
+    await events.start()
+    await fail_interrupted_jobs()
+    archive.start()
+    yield
+    archive.stop()
+    await stop_ocr_jobs()
+    await events.stop()
+    shutdown_pool()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all for easy testing (restrict in prod)
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def response_class_options() -> dict:
+    # FastAPI releases that dump response models straight to JSON bytes in
+    # pydantic-core are already faster than orjson (and deprecate
+    # ORJSONResponse); older ones get ORJSONResponse when orjson is installed
+    if "dump_json" in inspect.signature(serialize_response).parameters:
+        return {}
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return {}
+    from fastapi.responses import ORJSONResponse
+    return {"default_response_class": ORJSONResponse}
 
-app.include_router(auth_router)
-app.include_router(logs_router)
-app.include_router(materials_router)
-app.include_router(progress_router)
-app.include_router(documents_router)
+def create_app() -> FastAPI:
+    # Preload-friendly: with gunicorn --preload the master imports every module once and
+    # forked workers share them copy-on-write; uvicorn app.main:create_app --factory also works
+    app = FastAPI(title="PV Site Manager API", version="0.1.0", lifespan=lifespan, **response_class_options())
 
-@app.get("/")
-def root():
-    return {"message": "Welcome to 56 MW PV Site Manager API! /docs for Swagger."}
\ No newline at end of file
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allow all for easy testing (restrict in prod)
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
+    )
+    # Outermost, so CORS and error handling are part of the measured latency
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    app.include_router(auth_router)
+    app.include_router(logs_router)
+    app.include_router(materials_router)
+    app.include_router(progress_router)
+    app.include_router(documents_router)
+    app.include_router(dashboard_router)
+    app.include_router(search_router)
+    app.include_router(export_router)
+    app.include_router(events_router)
+    app.include_router(sync_router)
+
+    @app.get("/")
+    def root():
+        return {"message": "Welcome to 56 MW PV Site Manager API! /docs for Swagger."}
+
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics(request: Request):
+        # Prometheus scrape endpoint; protect it with METRICS_TOKEN outside a private network
+        if metrics.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    return app
+
+app = create_app()
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Request, SQL, argon2 and OCR timings in Prometheus text format (GET /metrics).
+# Metrics live in process memory, so with several workers each one reports its
+# own numbers; scrape every worker or run one per container.
+
+# Log statements slower than this many milliseconds; 0 disables the slow-query log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 0))
+# Debug only: add a Server-Timing header with the DB/argon2/OCR breakdown of
+# each request (shown in the browser dev tools)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+slow_query_log = logging.getLogger("app.sql")
+
+# name -> [count, seconds] for the request being handled, None outside requests
+_request_timings = ContextVar("request_timings", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, labels)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def add(self, amount: float, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds: float, *labels):
+        with self._lock:
+            value = self._values.get(labels)
+            if value is None:
+                # per-bucket counts (the last one is +Inf), sum
+                value = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            value[0][bisect_left(self.buckets, seconds)] += 1
+            value[1] += seconds
+
+    def _samples(self, labels, value) -> list:
+        counts, total = value[0][:], value[1]
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+_registry = []
+
+http_requests = Counter("pv_http_requests_total", "HTTP requests by route and status code.", ["method", "route", "status"])
+http_latency = Histogram("pv_http_request_duration_seconds", "HTTP request latency until the response body is sent.", ["method", "route"])
+http_in_flight = Gauge("pv_http_requests_in_progress", "HTTP requests currently being handled.")
+sse_connections = Gauge("pv_sse_connections", "Open GET /events streams.")
+db_queries = Histogram("pv_db_query_duration_seconds", "SQL statement execution time by statement type.", ["operation"], QUERY_BUCKETS)
+db_slow_queries = Counter("pv_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.")
+operations = Histogram("pv_operation_duration_seconds", "Timed expensive operations (argon2 verification, OCR).", ["operation"], SLOW_BUCKETS)
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def _record(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+@contextmanager
+def timed(operation: str):
+    """Time a block into pv_operation_duration_seconds and the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        operations.observe(elapsed, operation)
+        _record(operation, elapsed)
+
+def instrument_engine(engine):
+    """Time every SQL statement run on a (sync) engine."""
+    from sqlalchemy import event
+
+    # The start time rides on the statement's execution context, which is dropped
+    # with the statement; a failed statement never reaches after_cursor_execute
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        db_queries.observe(elapsed, statement.lstrip().split(None, 1)[0].upper())
+        _record("db", elapsed)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_queries.inc()
+            slow_query_log.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+def _server_timing(timings: dict, total: float) -> bytes:
+    parts = [f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (count, seconds) in sorted(timings.items())]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode()
+
+class MetricsMiddleware:
+    """Per-route latency, status counts and in-flight requests (pure ASGI, so streamed responses are timed to the last byte)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start)))
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        http_in_flight.add(1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.add(-1)
+            _request_timings.reset(token)
+            # Route templates, not raw paths, keep the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_latency.observe(time.perf_counter() - start, scope["method"], route)
+            http_requests.inc(scope["method"], route, str(status_code))
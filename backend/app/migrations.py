@@ -0,0 +1,160 @@
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, event, func, inspect, insert, select, text, update
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.pool import NullPool
+from .database import SQLALCHEMY_DATABASE_URL, BACKEND, apply_sqlite_pragmas
+from .models import ArchivedMonth, Base, DailyLog, Document, EventRecord, OcrJob, SyncCounter, Tombstone
+from .search import install_search
+from .sync import SYNCED_MODELS, next_version
+
+# Versioned schema migrations. Pending migrations run in order, in one
+# transaction that holds the database's write lock (BEGIN IMMEDIATE on SQLite,
+# an advisory lock on PostgreSQL), so workers starting together apply each one
+# exactly once. Once a database is current, startup costs a single query.
+#
+# Migrations are idempotent (create if missing, add column if missing): the
+# baseline creates fresh databases from the current models, so later
+# migrations must be no-ops there and only do work on older databases.
+# Append new migrations at the end; never renumber or edit applied ones.
+#
+#     python -m app.migrations        (from the backend directory)
+
+MIGRATIONS = []
+# Arbitrary constant shared by every process migrating the same PostgreSQL database
+PG_MIGRATION_LOCK = 560_021
+
+schema_versions = Table(
+    "schema_versions", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+def migration(version: int, description: str):
+    def register(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return register
+
+def add_missing_columns(conn, table):
+    # New columns must be nullable: existing rows have no value for them
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing and column.nullable:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def create_missing_indexes(conn, table):
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+@migration(1, "Tables, columns and indexes as of the switch to versioned migrations")
+def _baseline(conn):
+    # Also catches up databases that were kept current by create_all plus
+    # nullable-column additions at startup
+    Base.metadata.create_all(bind=conn)
+    for table in Base.metadata.sorted_tables:
+        add_missing_columns(conn, table)
+        create_missing_indexes(conn, table)
+
+@migration(2, "Full-text search tables and triggers (SQLite only)")
+def _search(conn):
+    install_search(conn)
+
+@migration(3, "Event feed table for the database event broker")
+def _events(conn):
+    EventRecord.__table__.create(bind=conn, checkfirst=True)
+
+@migration(4, "Row versions, updated_at and tombstones for delta sync")
+def _sync(conn):
+    SyncCounter.__table__.create(bind=conn, checkfirst=True)
+    Tombstone.__table__.create(bind=conn, checkfirst=True)
+    # Existing rows share one version, so a client's first sync picks them all up
+    version = next_version(conn)
+    for table in (model.__table__ for model in SYNCED_MODELS):
+        add_missing_columns(conn, table)
+        create_missing_indexes(conn, table)
+        created_at = table.c.created_at if "created_at" in table.c else datetime.utcnow()
+        conn.execute(update(table).where(table.c.row_version.is_(None)).values(
+            row_version=version, updated_at=func.coalesce(table.c.updated_at, created_at)
+        ))
+
+@migration(5, "Catalog of archived months of daily logs and documents")
+def _archive_catalog(conn):
+    ArchivedMonth.__table__.create(bind=conn, checkfirst=True)
+
+@migration(6, "Index on ocr_jobs.material_id for the search triggers")
+def _ocr_job_material_index(conn):
+    create_missing_indexes(conn, OcrJob.__table__)
+
+@migration(7, "AUTOINCREMENT ids for daily_logs and documents (SQLite only)")
+def _autoincrement(conn):
+    # Plain rowid tables hand out max(id) + 1, so once archiving empties a table
+    # (or its newest rows are deleted) new rows would take ids that archived
+    # rows, sync clients and cached URLs still use. SQLite cannot add
+    # AUTOINCREMENT in place: the table is rebuilt under the same name.
+    if conn.dialect.name != "sqlite":
+        return
+    for table in (DailyLog.__table__, Document.__table__):
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}).scalar()
+        if "AUTOINCREMENT" not in sql.upper():
+            rebuilt = f"{table.name}_rebuilt"
+            create = str(CreateTable(table).compile(dialect=conn.dialect))
+            conn.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)))
+            columns = ", ".join(c.name for c in table.columns)
+            conn.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}"))
+            # Drops the old indexes and search triggers too; both are recreated below
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}"))
+            create_missing_indexes(conn, table)
+        # Continue above every id handed out so far, archived ones included
+        last_id = max(
+            conn.scalar(select(func.max(table.c.id))) or 0,
+            conn.scalar(select(func.max(ArchivedMonth.max_id)).where(ArchivedMonth.table_name == table.name)) or 0,
+            conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": table.name}).scalar() or 0,
+        )
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table.name, "seq": last_id})
+    install_search(conn)
+
+def _migration_engine():
+    migration_engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    if BACKEND == "sqlite":
+        apply_sqlite_pragmas(migration_engine)
+
+        @event.listens_for(migration_engine, "connect")
+        def _manual_transactions(dbapi_connection, connection_record):
+            # pysqlite would commit before every DDL statement
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(migration_engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    return migration_engine
+
+def migrate() -> list:
+    """Apply pending migrations; returns the versions applied."""
+    migration_engine = _migration_engine()
+    applied = []
+    try:
+        with migration_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_MIGRATION_LOCK})
+            schema_versions.create(bind=conn, checkfirst=True)
+            current = conn.scalar(select(func.max(schema_versions.c.version))) or 0
+            for version, description, upgrade in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version <= current:
+                    continue
+                upgrade(conn)
+                conn.execute(insert(schema_versions).values(version=version, description=description, applied_at=datetime.utcnow()))
+                applied.append(version)
+    finally:
+        migration_engine.dispose()
+    return applied
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        sys.exit("usage: python -m app.migrations")
+    applied = migrate()
+    print(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Database schema is up to date")
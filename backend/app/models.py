@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Text, Index, UniqueConstraint, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,6 +17,12 @@ class User(Base):
 
 class DailyLog(Base):
     __tablename__ = "daily_logs"
+    __table_args__ = (
+        # Keyset pagination: per-user listing ordered by (date, id)
+        Index("ix_daily_logs_user_date_id", "user_id", "date", "id"),
+        # Never reuse an id, even once archiving has emptied the table (migration 7)
+        {"sqlite_autoincrement": True},
+    )
     id = Column(Integer, primary_key=True, index=True)
     date = Column(DateTime, default=datetime.utcnow)
     workers_count = Column(Integer, nullable=False)
@@ -29,8 +35,34 @@ class DailyLog(Base):
 
     documents = relationship("Document", back_populates="daily_log")
 
+class DailyLogRollup(Base):
+    # Per-day, per-user totals upserted whenever logs are written; analytics read these instead of daily_logs
+    __tablename__ = "daily_log_rollups"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    log_count = Column(Integer, nullable=False, default=0)
+    workers_sum = Column(Integer, nullable=False, default=0)
+    hours_sum = Column(Float, nullable=False, default=0.0)
+    man_hours_sum = Column(Float, nullable=False, default=0.0)  # sum of workers_count * hours_worked
+    fuel_sum = Column(Float, nullable=False, default=0.0)
+
+class SyncCounter(Base):
+    # Single row (id = 1): the last row version handed out (see app/sync.py)
+    __tablename__ = "sync_counter"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    pruned_version = Column(Integer, nullable=False, default=0)  # newest tombstone pruned so far
+
+# Default for Core statements that bypass the session hooks; they must claim a
+# version first (sync.next_version) so this reads the transaction's own number
+CURRENT_ROW_VERSION = select(SyncCounter.version).where(SyncCounter.id == 1).scalar_subquery()
+
 class Material(Base):
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_created_at_id", "created_at", "id"),
+        Index("ix_materials_row_version_id", "row_version", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     ddt_number = Column(String, unique=True, nullable=False)
     packing_list = Column(Text)
@@ -39,27 +71,135 @@ class Material(Base):
     non_conformity = Column(Boolean, default=False)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    row_version = Column(Integer, default=CURRENT_ROW_VERSION, onupdate=CURRENT_ROW_VERSION)
 
     documents = relationship("Document", back_populates="material")
 
 class ProjectProgress(Base):
     __tablename__ = "project_progress"
+    __table_args__ = (
+        # Open milestones past their target: actual_date IS NULL AND target_date < now
+        Index("ix_project_progress_actual_target", "actual_date", "target_date"),
+        Index("ix_project_progress_row_version_id", "row_version", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     kpi_name = Column(String, nullable=False)
     progress_percent = Column(Float, nullable=False)
     target_date = Column(DateTime)
     actual_date = Column(DateTime)
     notes = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    row_version = Column(Integer, default=CURRENT_ROW_VERSION, onupdate=CURRENT_ROW_VERSION)
+
+class ProgressSummary(Base):
+    # Single row (id = 1) maintained by the progress router alongside every KPI write
+    __tablename__ = "progress_summary"
+    id = Column(Integer, primary_key=True)
+    kpi_count = Column(Integer, nullable=False, default=0)
+    progress_sum = Column(Float, nullable=False, default=0.0)
+    completed_late = Column(Integer, nullable=False, default=0)  # actual_date > target_date
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_created_at_id", "created_at", "id"),
+        Index("ix_documents_row_version_id", "row_version", "id"),
+        # Ids are never reused: archived and deleted documents keep theirs (migration 7)
+        {"sqlite_autoincrement": True},
+    )
     id = Column(Integer, primary_key=True, index=True)
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
+    # Content-addressed blob (see Blob); NULL for files uploaded before deduplication
+    content_hash = Column(String, ForeignKey("blobs.digest"), nullable=True, index=True)
+    size = Column(Integer)
+    original_filename = Column(String)
     notes = Column(Text)
     material_id = Column(Integer, ForeignKey("materials.id"), nullable=True)
     log_id = Column(Integer, ForeignKey("daily_logs.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    row_version = Column(Integer, default=CURRENT_ROW_VERSION, onupdate=CURRENT_ROW_VERSION)
 
     material = relationship("Material", back_populates="documents")
-    daily_log = relationship("DailyLog", back_populates="documents")
\ No newline at end of file
+    daily_log = relationship("DailyLog", back_populates="documents")
+
+class OcrJob(Base):
+    __tablename__ = "ocr_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'running', 'done', 'failed'
+    filename = Column(String, nullable=False)
+    error = Column(Text)
+    raw_text = Column(Text)  # full OCR output; the material's packing_list keeps only a prefix
+    user_id = Column(Integer, ForeignKey("users.id"))
+    # Indexed: the search triggers look up a material's OCR text on every write
+    material_id = Column(Integer, ForeignKey("materials.id"), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    material = relationship("Material")
+
+class OcrCacheEntry(Base):
+    __tablename__ = "ocr_cache"
+    # sha256 of the image bytes + fingerprint of the OCR configuration
+    key = Column(String, primary_key=True)
+    raw_text = Column(Text, nullable=False)
+    ddt_number = Column(String)
+    batch_number = Column(String)
+    size = Column(Integer, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    # sha256 of the stored bytes; refcount = number of Document rows pointing at it
+    digest = Column(String, primary_key=True)
+    size = Column(Integer, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "endpoint", "key", name="uq_idempotency_keys_user_endpoint_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    response = Column(Text, nullable=False)  # JSON body replayed on retry
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+    # One row per deleted synced row, so delta sync can tell clients to drop it
+    __table_args__ = (
+        Index("ix_tombstones_row_version_id", "row_version", "id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resource = Column(String, nullable=False)  # table name
+    row_id = Column(Integer, nullable=False)
+    row_version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class EventRecord(Base):
+    __tablename__ = "events"
+    # Change feed shared by worker processes (EVENTS_BROKER=database): one row per
+    # committed transaction, written in that transaction and polled by every worker
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String, nullable=False)  # writing worker's instance id
+    payload = Column(Text, nullable=False)  # JSON: changed tables and row changes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedMonth(Base):
+    __tablename__ = "archive_months"
+    # Catalog of months moved out of the hot tables into per-month archive databases (see app/archive.py)
+    table_name = Column(String, primary_key=True)  # 'daily_logs' or 'documents'
+    month = Column(String, primary_key=True)  # 'YYYY-MM'
+    file_name = Column(String, nullable=False)  # inside ARCHIVE_DIR
+    row_count = Column(Integer, nullable=False, default=0)
+    min_id = Column(Integer)  # id range, to route lookups by id
+    max_id = Column(Integer)
+    archived_at = Column(DateTime, default=datetime.utcnow)
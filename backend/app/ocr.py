@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+
+# Tesseract is CPU-bound, so scans are OCR'd in a bounded pool of worker processes
+# rather than on the event loop. Keep this module free of app imports: with the
+# "spawn" start method (Windows) every worker re-imports it.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+# Upper bound on jobs waiting for or holding a worker; beyond this uploads are refused
+OCR_MAX_QUEUED = int(os.getenv("OCR_MAX_QUEUED", 100))
+# Uploads only live in the memory of the process running the job; a job left
+# unfinished this long was orphaned by a worker that stopped and is failed
+OCR_JOB_TIMEOUT_SECONDS = int(os.getenv("OCR_JOB_TIMEOUT_SECONDS", 900))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "")
+
+# Preprocessing: OCR time grows with pixel count, and a 12 MP phone photo carries
+# far more detail than Tesseract needs for a printed delivery note.
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1") == "1"
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", 300))
+OCR_MAX_PDF_PAGES = int(os.getenv("OCR_MAX_PDF_PAGES", 20))
+
+# Delivery notes are A4; phone photos carry no usable DPI, so scale by page width
+A4_WIDTH_INCHES = 8.27
+
+_pool = None
+
+def parse_ocr_text(text: str) -> dict:
+    ddt_match = re.search(r'DDT[:\s]*(\w+)', text, re.IGNORECASE)
+    batch_match = re.search(r'BATCH[:\s]*(\w+)', text, re.IGNORECASE)
+    return {
+        'ddt_number': ddt_match.group(1) if ddt_match else None,
+        'batch_number': batch_match.group(1) if batch_match else None,
+        'full_text': text
+    }
+
+def is_pdf(contents: bytes) -> bool:
+    return contents[:5] == b"%PDF-"
+
+def pdf_supported() -> bool:
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _otsu_threshold(histogram) -> int:
+    total = sum(histogram)
+    weighted_total = sum(i * h for i, h in enumerate(histogram))
+    background = background_weighted = 0
+    best_threshold, best_variance = 127, 0.0
+    for i, h in enumerate(histogram):
+        background += h
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        background_weighted += i * h
+        mean_bg = background_weighted / background
+        mean_fg = (weighted_total - background_weighted) / foreground
+        variance = background * foreground * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    return best_threshold
+
+def preprocess_image(image):
+    from PIL import Image, ImageOps
+    max_width = int(A4_WIDTH_INCHES * OCR_TARGET_DPI)
+    if image.format == "JPEG" and min(image.size) > max_width:
+        # Let the JPEG decoder downscale by DCT scaling instead of decoding every pixel
+        scale = max_width / min(image.size)
+        image.draft("L", (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    if min(image.size) > max_width:
+        scale = max_width / min(image.size)
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+    image = ImageOps.autocontrast(image)
+    threshold = _otsu_threshold(image.histogram())
+    return image.point(lambda p: 255 if p > threshold else 0, mode="1")
+
+def _image_to_string(image) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG)
+
+def _ocr_page(image) -> str:
+    # The whole page is always read: its text is stored and indexed, so there is
+    # no cheaper region to stop at once the DDT/BATCH header is found
+    if OCR_PREPROCESS:
+        image = preprocess_image(image)
+    return _image_to_string(image)
+
+def _iter_pdf_pages(contents: bytes):
+    # Render one page at a time so a long PDF never sits fully rasterised in memory
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(contents)
+    try:
+        for index in range(min(len(pdf), OCR_MAX_PDF_PAGES)):
+            page = pdf[index]
+            try:
+                yield page.render(scale=OCR_TARGET_DPI / 72).to_pil()
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+
+def ocr_document(contents: bytes):
+    """OCR an image or PDF; returns (text, pages_processed).
+
+    PDF pages are read in order and reading stops as soon as both the DDT and
+    batch numbers have been found.
+    """
+    from PIL import Image
+    if not is_pdf(contents):
+        return _ocr_page(Image.open(io.BytesIO(contents))), 1
+    texts = []
+    for page in _iter_pdf_pages(contents):
+        texts.append(_ocr_page(page))
+        parsed = parse_ocr_text("\n".join(texts))
+        if parsed['ddt_number'] and parsed['batch_number']:
+            break
+    return "\n".join(texts), len(texts)
+
+def extract_text(contents: bytes) -> str:
+    # Runs inside a worker process
+    return ocr_document(contents)[0]
+
+def config_fingerprint() -> str:
+    # Anything that can change the OCR output for the same bytes belongs here
+    settings = [OCR_LANG, OCR_TESSERACT_CONFIG, OCR_PREPROCESS, OCR_TARGET_DPI, OCR_MAX_PDF_PAGES]
+    return hashlib.sha256("|".join(map(str, settings)).encode()).hexdigest()[:16]
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # Imported here: multiprocessing is only needed once a scan arrives
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def run_ocr(contents: bytes) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), extract_text, contents)
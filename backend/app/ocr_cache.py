@@ -0,0 +1,48 @@
+import hashlib
+import os
+from datetime import datetime
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import OcrCacheEntry
+from .ocr import config_fingerprint
+
+# Persistent OCR result cache: identical scans (re-uploads, the same packing list
+# attached twice) are answered from SQLite instead of re-running Tesseract.
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 10000))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+def cache_key(contents: bytes) -> str:
+    return f"{hashlib.sha256(contents).hexdigest()}:{config_fingerprint()}"
+
+async def get_cached(db: AsyncSession, key: str):
+    entry = await db.get(OcrCacheEntry, key)
+    if entry is not None:
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        await db.commit()
+    return entry
+
+async def store(db: AsyncSession, key: str, parsed: dict):
+    entry = await db.get(OcrCacheEntry, key)
+    if entry is None:
+        entry = OcrCacheEntry(key=key)
+        db.add(entry)
+    entry.raw_text = parsed["full_text"]
+    entry.ddt_number = parsed["ddt_number"]
+    entry.batch_number = parsed["batch_number"]
+    entry.size = len(parsed["full_text"].encode())
+    entry.last_used_at = datetime.utcnow()
+    await db.flush()
+    await evict(db)
+    await db.commit()
+    return entry
+
+async def evict(db: AsyncSession):
+    # LRU: walk entries newest-first and drop everything past either budget
+    ranked = select(
+        OcrCacheEntry.key,
+        func.row_number().over(order_by=OcrCacheEntry.last_used_at.desc()).label("rank"),
+        func.sum(OcrCacheEntry.size).over(order_by=OcrCacheEntry.last_used_at.desc()).label("running_bytes"),
+    ).subquery()
+    stale = select(ranked.c.key).where((ranked.c.rank > OCR_CACHE_MAX_ENTRIES) | (ranked.c.running_bytes > OCR_CACHE_MAX_BYTES))
+    await db.execute(delete(OcrCacheEntry).where(OcrCacheEntry.key.in_(stale)))
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+# Opaque keyset cursors: the sort key of the last row on a page, base64-encoded.
+# Filtering on (key, id) > cursor lets the index seek straight to the next page
+# instead of scanning and discarding `skip` rows.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(v) if col.type.python_type is datetime and v is not None else v
+            for col, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def paginate(db, stmt, columns, cursor: str = None, skip: int = 0, limit: int = 100, scalars: bool = True):
+    """Order `stmt` by `columns` and return (rows, next_cursor).
+
+    With a cursor the page is a keyset seek; without one the legacy skip/limit
+    offset is used so old clients keep working. Pass scalars=False for
+    statements selecting plain columns rather than one entity.
+    """
+    stmt = stmt.order_by(*columns)
+    if cursor:
+        stmt = stmt.where(tuple_(*columns) > tuple_(*decode_cursor(cursor, columns)))
+    else:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit))
+    rows = result.scalars().all() if scalars else result.all()
+    next_cursor = None
+    if rows and len(rows) == limit:
+        next_cursor = encode_cursor([getattr(rows[-1], col.key) for col in columns])
+    return rows, next_cursor
+
+def set_next_cursor(response, next_cursor):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from . import changes
+from .models import User
+
+@dataclass(frozen=True)
+class Principal:
+    # The parts of a User that auth and role checks need; safe to share across sessions
+    id: int
+    username: str
+    role: str
+
+class PrincipalCache:
+    """In-process TTL + LRU cache of principals keyed by token subject (username)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by clear(), so a lookup that raced an invalidation is not cached
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[principal.username] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+principal_cache = PrincipalCache()
+
+# Drop cached principals once a commit touches the users table. on_change also
+# fires for commits relayed from other worker processes (events.py), and the
+# changed-table tracking covers bulk statements, so no worker keeps serving a
+# renamed, demoted or deleted user until the TTL runs out.
+@changes.on_change
+def _invalidate_users(tables):
+    if User.__tablename__ in tables:
+        principal_cache.clear()
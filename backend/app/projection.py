@@ -0,0 +1,57 @@
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, selectinload
+
+# `fields=` projection for read endpoints: only the requested columns are
+# selected, so large Text columns (packing lists, notes, tasks) are never
+# fetched or serialized unless a client asks for them. `include=` embeds
+# related rows, loaded with one extra query per relationship for the whole
+# page rather than one per row.
+
+def parse_fields(fields: Optional[str], allowed, default) -> list:
+    """Comma-separated field names -> validated list; `id` is always included."""
+    if not fields:
+        return list(default)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+def parse_include(include: Optional[str], allowed: dict) -> dict:
+    """Comma-separated relationship names -> {name: fields to serialize}."""
+    if not include:
+        return {}
+    requested = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown include: {', '.join(unknown)}")
+    return {name: allowed[name] for name in requested}
+
+def select_fields(model, fields, *extra_columns, include: dict = None):
+    # Extra columns (sort keys for the cursor, inputs to derived values) are
+    # selected too but left out of the serialized row
+    columns = [getattr(model, f) for f in fields]
+    columns += [c for c in extra_columns if c.key not in fields]
+    if not include:
+        return select(*columns)
+    # Related rows need entities; load_only keeps the projection on both sides
+    options = []
+    for name, related_fields in include.items():
+        relationship = getattr(model, name)
+        related = relationship.property.mapper.class_
+        # The join key on this side (e.g. material_id) must be loaded for the related query
+        columns += [getattr(model, c.key) for c in relationship.property.local_columns if c.key not in fields]
+        options.append(selectinload(relationship).load_only(*(getattr(related, f) for f in related_fields)))
+    return select(model).options(load_only(*columns), *options)
+
+def row_dict(row, fields, include: dict = None) -> dict:
+    data = {f: getattr(row, f) for f in fields}
+    for name, related_fields in (include or {}).items():
+        value = getattr(row, name)
+        if isinstance(value, list):
+            data[name] = [row_dict(item, related_fields) for item in value]
+        else:
+            data[name] = row_dict(value, related_fields) if value is not None else None
+    return data
@@ -2,14 +2,17 @@ import sys
 sys.path.insert(0, r'E:\new\backend')  # Temp fix for imports
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from ..database import get_db
+from ..database import get_async_db
+from ..metrics import timed
 from ..models import User
+from ..principal_cache import Principal, principal_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -18,8 +21,9 @@ SECRET_KEY = "your-secret-key-change-in-prod"  # Change for prod
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Switch to argon2 (no length bug)
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Switch to argon2 (no length bug). passlib and the argon2 bindings load on the
+# first login or registration rather than at worker startup
+_pwd_context = None
 security = HTTPBearer()
 
 class UserCreate(BaseModel):
@@ -35,12 +39,20 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+    return _pwd_context
+
 # Hash password
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with timed("argon2"):
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 # Create token
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -54,27 +66,39 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 # Get current user from token
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def authenticate_token(token: str, db: AsyncSession, scope: str = None):
+    """Principal for a token; `scope` names the single-purpose tokens (e.g. "events")
+    that are only accepted where asked for, never as access tokens."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    # Most requests are served from the principal cache without touching the users table
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return principal
+    generation = principal_cache.generation
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal(id=user.id, username=user.username, role=user.role)
+    principal_cache.put(principal, generation)
+    return principal
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    return await authenticate_token(credentials.credentials, db)
 
 # Role check dependency
 def require_role(required_role: str):
-    def role_checker(current_user: User = Depends(get_current_user)):
+    def role_checker(current_user: Principal = Depends(get_current_user)):
         role_hierarchy = {"Operator": 1, "SiteManager": 2, "PM": 3, "Admin": 4}
         if role_hierarchy.get(current_user.role, 0) < role_hierarchy.get(required_role, 0):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient role")
@@ -82,27 +106,31 @@ def require_role(required_role: str):
     return role_checker
 
 @router.post("/register", response_model=Token)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.username == user_data.username).first()
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(User).where(User.username == user_data.username))
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
     db_user = User(username=user_data.username, hashed_password=hashed_password, role=user_data.role)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": user_data.username}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == user_data.username).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == user_data.username))
+    # argon2 is deliberately slow; keep it off the event loop
+    if not user or not await run_in_threadpool(verify_password, user_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/principal-cache", response_model=None)
+def principal_cache_stats(current_user: Principal = Depends(require_role("Admin"))):
+    return principal_cache.stats()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import sys
+sys.path.insert(0, r'E:\pv-clean\backend')
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+import threading
+import time
+from ..changes import versions
+from ..database import get_async_db
+from ..etag import conditional
+from ..routers.auth import get_current_user
+from .documents import list_documents
+from .logs import list_daily_logs
+from .materials import list_materials
+from .progress import list_progress
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+DASHBOARD_TABLES = ("daily_logs", "materials", "project_progress", "documents")
+DASHBOARD_CACHE_SIZE = 1024
+# Overdue milestones depend on the clock as well as the data
+DASHBOARD_CACHE_TTL_SECONDS = 60
+
+class DashboardCache:
+    # Assembled payloads per (user, role), valid while the table versions they
+    # were built from are unchanged; any committed write to those tables
+    # invalidates them without an explicit purge.
+    def __init__(self, maxsize: int = DASHBOARD_CACHE_SIZE, ttl: float = DASHBOARD_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, current_versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == current_versions and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, current_versions, payload):
+        with self._lock:
+            self._entries[key] = (current_versions, payload, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+dashboard_cache = DashboardCache()
+
+@router.get("", response_model=None, dependencies=[Depends(conditional(*DASHBOARD_TABLES, clock_seconds=DASHBOARD_CACHE_TTL_SECONDS))])
+async def read_dashboard(current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    key = (current_user.id, current_user.role)
+    # Snapshot versions before querying so a write landing mid-build is never cached as current
+    current_versions = versions(DASHBOARD_TABLES)
+    payload = dashboard_cache.get(key, current_versions)
+    if payload is not None:
+        return payload
+    
+    logs, _ = await list_daily_logs(db, current_user.id)
+    materials, _ = await list_materials(db)
+    progress, _ = await list_progress(db)
+    documents, _ = await list_documents(db)
+    payload = {"logs": logs, "materials": materials, "progress": progress, "documents": documents}
+    dashboard_cache.put(key, current_versions, payload)
+    return payload
\ No newline at end of file
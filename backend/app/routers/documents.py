@@ -1,15 +1,24 @@
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
+import mimetypes
 import os
-import shutil
-from ..database import get_db
-from ..models import Document, DailyLog, Material
+from ..archive import find_archived
+from ..etag import conditional, not_modified, REVALIDATE_CACHE_CONTROL
+from ..database import get_async_db, dialect_insert
+from ..models import Blob, Document, DailyLog, Material
+from ..storage import storage, MAX_UPLOAD_BYTES
+from ..thumbnails import get_thumbnail, snap_size
+from ..pagination import paginate, set_next_cursor
+from ..projection import parse_fields, parse_include, select_fields, row_dict
 from ..routers.auth import get_current_user
 
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -19,79 +28,198 @@ class DocumentCreate(BaseModel):
     material_id: Optional[int] = None
     notes: Optional[str] = None
 
+# Every field is optional because `fields=` may project any subset
+class DocumentRead(BaseModel):
+    id: int
+    file_path: Optional[str] = None
+    file_type: Optional[str] = None
+    notes: Optional[str] = None
+    log_id: Optional[int] = None
+    material_id: Optional[int] = None
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    original_filename: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+DOCUMENT_FIELDS = ["id", "file_path", "file_type", "notes", "log_id", "material_id", "content_hash", "size", "original_filename", "created_at"]
+DOCUMENT_DEFAULT_FIELDS = ["id", "file_path", "file_type", "notes", "log_id", "material_id"]
+
+# Shapes embedded by `include=`, here and on the materials/logs endpoints
+class DocumentSummary(BaseModel):
+    id: int
+    file_path: str
+    file_type: str
+    original_filename: Optional[str] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class MaterialSummary(BaseModel):
+    id: int
+    ddt_number: str
+    batch_number: str
+    non_conformity: Optional[bool] = None
+
+class DailyLogSummary(BaseModel):
+    id: int
+    date: Optional[datetime] = None
+    workers_count: int
+    user_id: Optional[int] = None
+
+DOCUMENT_SUMMARY_FIELDS = ["id", "file_path", "file_type", "original_filename", "notes", "created_at"]
+DOCUMENT_INCLUDES = {
+    "material": ["id", "ddt_number", "batch_number", "non_conformity"],
+    "daily_log": ["id", "date", "workers_count", "user_id"],
+}
+
+class DocumentWithRelated(DocumentRead):
+    material: Optional[MaterialSummary] = None
+    daily_log: Optional[DailyLogSummary] = None
+
 @router.post("/", response_model=None)
 async def create_document(
+    request: Request,
     file: UploadFile = File(...),
     doc_data: DocumentCreate = Depends(),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
     if doc_data.log_id:
-        log = db.query(DailyLog).filter(DailyLog.id == doc_data.log_id).first()
+        log = await db.get(DailyLog, doc_data.log_id)
         if not log:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Daily log not found")
     if doc_data.material_id:
-        material = db.query(Material).filter(Material.id == doc_data.material_id).first()
+        material = await db.get(Material, doc_data.material_id)
         if not material:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
     
     if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.pdf')):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only PNG/JPG/PDF supported")
     
-    os.makedirs("uploads", exist_ok=True)
-    file_path = f"uploads/{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Reject oversized uploads up front when the client declares the size
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+    
+    blob = await storage.save(file)
+    try:
+        # One blob row per distinct content; duplicates only bump the reference
+        # count. The row is claimed before the file goes into place, so a delete
+        # removing the same blob's file (which holds the row meanwhile) either
+        # finishes first or sees this reference and keeps the file.
+        await db.execute(
+            dialect_insert(Blob)
+            .values(digest=blob.digest, size=blob.size, refcount=1, created_at=datetime.utcnow())
+            .on_conflict_do_update(index_elements=[Blob.digest], set_={"refcount": Blob.refcount + 1})
+        )
+        await storage.publish(blob)
+    finally:
+        await storage.discard(blob)
     
     db_doc = Document(
-        file_path=file_path,
+        file_path=blob.path,
         file_type="photo" if file.filename.lower().endswith(('.png', '.jpg', '.jpeg')) else "pdf",
         notes=doc_data.notes,
         log_id=doc_data.log_id,
-        material_id=doc_data.material_id
+        material_id=doc_data.material_id,
+        content_hash=blob.digest,
+        size=blob.size,
+        original_filename=file.filename
     )
     db.add(db_doc)
-    db.commit()
-    db.refresh(db_doc)
-    return {"message": "Document uploaded", "id": db_doc.id, "file_path": file_path}
-
-@router.get("/", response_model=None)
-def read_documents(skip: int = 0, limit: int = 100, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    docs = db.query(Document).offset(skip).limit(limit).all()
-    return [{
-        "id": d.id,
-        "file_path": d.file_path,
-        "file_type": d.file_type,
-        "notes": d.notes,
-        "log_id": d.log_id,
-        "material_id": d.material_id
-    } for d in docs]
-
-@router.get("/{document_id}", response_model=None)
-def read_document(document_id: int, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    doc = db.query(Document).filter(Document.id == document_id).first()
+    await db.commit()
+    return {"message": "Document uploaded", "id": db_doc.id, "file_path": blob.path, "content_hash": blob.digest}
+
+async def list_documents(db: AsyncSession, cursor: Optional[str] = None, skip: int = 0, limit: int = 100, fields: List[str] = DOCUMENT_DEFAULT_FIELDS, include: dict = None):
+    stmt = select_fields(Document, fields, Document.created_at, include=include)
+    rows, next_cursor = await paginate(db, stmt, [Document.created_at, Document.id], cursor, skip, limit, scalars=bool(include))
+    return [row_dict(row, fields, include) for row in rows], next_cursor
+
+@router.get("/", response_model=List[DocumentWithRelated], response_model_exclude_unset=True, dependencies=[Depends(conditional("documents", "materials", "daily_logs"))])
+async def read_documents(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, fields: Optional[str] = None, include: Optional[str] = None, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    docs, next_cursor = await list_documents(db, cursor, skip, limit, parse_fields(fields, DOCUMENT_FIELDS, DOCUMENT_DEFAULT_FIELDS), parse_include(include, DOCUMENT_INCLUDES))
+    set_next_cursor(response, next_cursor)
+    return docs
+
+@router.get("/{document_id}", response_model=DocumentWithRelated, response_model_exclude_unset=True, dependencies=[Depends(conditional("documents", "materials", "daily_logs"))])
+async def read_document(document_id: int, fields: Optional[str] = None, include: Optional[str] = None, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    fields, include = parse_fields(fields, DOCUMENT_FIELDS, DOCUMENT_DEFAULT_FIELDS), parse_include(include, DOCUMENT_INCLUDES)
+    async def fetch(model):
+        result = await db.execute(select_fields(model, fields, include=include).where(model.id == document_id))
+        return result.scalars().first() if include else result.first()
+    row = await fetch(Document) or await find_archived(db, "documents", document_id, fetch)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    return row_dict(row, fields, include)
+
+async def _get_document(db: AsyncSession, document_id: int) -> Optional[Document]:
+    # Hot table first, then the archived months (read-only) whose id range covers it
+    async def fetch(model):
+        return await db.scalar(select(model).where(model.id == document_id))
+    return await db.get(Document, document_id) or await find_archived(db, "documents", document_id, fetch)
+
+def _document_path(doc: Document) -> str:
+    path = storage.local_path(doc.content_hash) if doc.content_hash else doc.file_path
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document file not found")
+    return path
+
+@router.get("/{document_id}/content", response_model=None)
+async def read_document_content(document_id: int, request: Request, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    doc = await _get_document(db, document_id)
     if not doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
-    return {
-        "id": doc.id,
-        "file_path": doc.file_path,
-        "file_type": doc.file_type,
-        "notes": doc.notes,
-        "log_id": doc.log_id,
-        "material_id": doc.material_id
-    }
+    # These URLs name a document, not its bytes, so clients revalidate every
+    # time; the strong ETag makes that a 304 without touching the file
+    headers = {"Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if doc.content_hash:
+        # Strong ETag: the content hash itself
+        headers["ETag"] = f'"{doc.content_hash}"'
+        if not_modified(request, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    filename = doc.original_filename or os.path.basename(doc.file_path)
+    media_type = "application/pdf" if doc.file_type == "pdf" else (mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    # FileResponse handles Range/If-Range and uses zero-copy pathsend where the server supports it
+    return FileResponse(_document_path(doc), media_type=media_type, filename=filename, content_disposition_type="inline", headers=headers)
+
+@router.get("/{document_id}/thumbnail", response_model=None)
+async def read_document_thumbnail(document_id: int, request: Request, size: int = Query(256, ge=16, le=2048), current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    doc = await _get_document(db, document_id)
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    size = snap_size(size)
+    key = doc.content_hash or f"doc{doc.id}"
+    headers = {"Cache-Control": REVALIDATE_CACHE_CONTROL, "ETag": f'"{key}-{size}"'}
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    path = await get_thumbnail(_document_path(doc), key, size, is_pdf_source=doc.file_type == "pdf")
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
 
 @router.delete("/{document_id}", response_model=None)
-def delete_document(document_id: int, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_document(document_id: int, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.role not in ["PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
-    doc = db.query(Document).filter(Document.id == document_id).first()
+    doc = await db.get(Document, document_id)
     if not doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
-    db.delete(doc)
-    db.commit()
+    digest, file_path = doc.content_hash, doc.file_path
+    await db.delete(doc)
+    if digest:
+        await db.execute(update(Blob).where(Blob.digest == digest).values(refcount=Blob.refcount - 1))
+    await db.commit()
+    
+    if digest:
+        # The file goes only while this transaction holds the unreferenced blob
+        # row (write lock on SQLite, row lock on PostgreSQL): an upload of the
+        # same bytes claims that row before publishing the file, so it waits
+        # and then puts the file back, or got in first and the row is kept
+        result = await db.execute(delete(Blob).where(Blob.digest == digest, Blob.refcount <= 0))
+        if result.rowcount:
+            await storage.delete(digest)
+        await db.commit()
+    elif os.path.isfile(file_path):
+        # Pre-deduplication upload: the file belonged to this document alone
+        await run_in_threadpool(os.remove, file_path)
     return {"message": "Document deleted", "id": document_id}
\ No newline at end of file
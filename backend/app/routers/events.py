@@ -0,0 +1,129 @@
+import sys
+sys.path.insert(0, r'E:\pv-clean\backend')
+
+import json
+import os
+import time
+from datetime import timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+from typing import Optional
+from .. import events
+from ..database import AsyncSessionLocal
+from ..metrics import sse_connections
+from ..routers.auth import authenticate_token, create_access_token, get_current_user, security
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# Reconnect delay suggested to EventSource clients
+EVENTS_RETRY_MS = 3000
+# EventSource cannot send headers and URLs end up in access logs and browser
+# history, so browsers open the stream with a stream token instead of their
+# access token: it only opens GET /events and only for this many seconds
+EVENTS_TOKEN_SECONDS = int(os.getenv("EVENTS_TOKEN_SECONDS", 60))
+EVENTS_TOKEN_SCOPE = "events"
+
+def _message(event_type: str, data: dict, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event_type}", "data: " + json.dumps(data, default=events.json_default, separators=(",", ":"))]
+    return "\n".join(lines) + "\n\n"
+
+def _change_message(record: dict, user) -> Optional[str]:
+    changes = events.visible_changes(record, user)
+    if not changes:
+        return None
+    return _message("change", {"changes": changes}, f"{events.broker.epoch}-{record['seq']}")
+
+def _resume_point(last_event_id: Optional[str]):
+    # "<epoch>-<seq>"; anything from another epoch (restarted process) cannot be resumed
+    epoch, _, seq = (last_event_id or "").rpartition("-")
+    if epoch == events.broker.epoch and seq.isdigit():
+        return int(seq)
+    return None
+
+async def _authenticate(request: Request, stream_token: Optional[str]):
+    # An access token in the Authorization header (non-browser clients), else ?stream_token=
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    scope = None
+    if not (scheme.lower() == "bearer" and token):
+        token, scope = stream_token, EVENTS_TOKEN_SCOPE
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    # A short-lived session: an open stream must not hold a pooled connection
+    async with AsyncSessionLocal() as db:
+        user = await authenticate_token(token, db, scope)
+    claims = jwt.get_unverified_claims(token)
+    # A stream lasts as long as the access token its stream token was issued for
+    return user, claims.get("until") if scope else claims.get("exp")
+
+async def _stream(user, last_event_id: Optional[str], expires_at: Optional[float]):
+    queue = events.bus.subscribe()
+    sse_connections.add(1)
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        last_seq = 0
+        if last_event_id:
+            after = _resume_point(last_event_id)
+            missed = await events.broker.replay(after) if after is not None else None
+            if missed is None:
+                yield _message("reset", {})
+            else:
+                for record in missed:
+                    last_seq = record["seq"]
+                    message = _change_message(record, user)
+                    if message:
+                        yield message
+        while True:
+            record = await queue.get()
+            if record is events.HEARTBEAT:
+                if expires_at and time.time() >= expires_at:
+                    # The client reconnects with a fresh token and Last-Event-ID
+                    return
+                yield ": keep-alive\n\n"
+            elif record is events.RESET:
+                yield _message("reset", {})
+            elif record["seq"] > last_seq:
+                last_seq = record["seq"]
+                message = _change_message(record, user)
+                if message:
+                    yield message
+    finally:
+        events.bus.unsubscribe(queue)
+        sse_connections.add(-1)
+
+@router.post("/token", response_model=None)
+async def create_stream_token(current_user = Depends(get_current_user), credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Token for opening GET /events?stream_token=..., valid for EVENTS_TOKEN_SECONDS.
+
+    It cannot be used as an access token, so one leaked through a URL does not
+    open the rest of the API.
+    """
+    until = jwt.get_unverified_claims(credentials.credentials).get("exp")
+    token = create_access_token(
+        {"sub": current_user.username, "scope": EVENTS_TOKEN_SCOPE, "until": until},
+        expires_delta=timedelta(seconds=EVENTS_TOKEN_SECONDS),
+    )
+    return {"stream_token": token, "expires_in": EVENTS_TOKEN_SECONDS}
+
+@router.get("", response_model=None)
+async def stream_events(
+    request: Request,
+    stream_token: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    resume_after: Optional[str] = Query(None, alias="last_event_id"),
+):
+    """Server-sent events: one `change` event per committed write to logs, materials, progress, documents or OCR jobs.
+
+    Operators only receive changes to their own logs and OCR jobs. Reconnects
+    send Last-Event-ID (or ?last_event_id=, for a new EventSource opened with a
+    fresh stream token) and get the missed events replayed; a `reset` event
+    means some were no longer available and the client should reload.
+    """
+    user, expires_at = await _authenticate(request, stream_token)
+    return StreamingResponse(
+        _stream(user, last_event_id or resume_after, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,126 @@
+import sys
+sys.path.insert(0, r'E:\pv-clean\backend')
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Literal, Optional
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
+import csv
+import io
+import json
+import zlib
+from ..archive import ARCHIVED, archived_months, attached
+from ..database import AsyncSessionLocal
+from ..models import DailyLog, Material, Document
+from ..routers.auth import get_current_user
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# Rows are fetched from the database cursor in batches and written out as they
+# arrive, so memory stays flat however many rows an export covers. Output goes
+# to the client in chunks of about EXPORT_CHUNK_BYTES (before compression):
+# large enough that gzip sync-flushes stay rare, small enough to keep streaming.
+EXPORT_BATCH_ROWS = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# resource -> (model, date column used by from/to, exported columns)
+EXPORTS = {
+    "logs": (DailyLog, "date", ["id", "date", "user_id", "workers_count", "hours_worked", "fuel_consumed", "tasks", "equipment_used"]),
+    "materials": (Material, "created_at", ["id", "ddt_number", "batch_number", "container_id", "packing_list", "non_conformity", "notes", "created_at"]),
+    "documents": (Document, "created_at", ["id", "file_type", "original_filename", "size", "content_hash", "material_id", "log_id", "notes", "created_at"]),
+}
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+def _value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (gzip;q=0 refuses it)."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            qualities[coding.lower()] = q
+    q = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return q > 0
+
+async def _export_body(model, stmt_for, columns, fmt: str, gzip: bool, date_from: Optional[date], date_to: Optional[date]):
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31: gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    def take(final: bool = False) -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor:
+            # Sync-flush every chunk so compressed output streams instead of pooling in zlib
+            data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        return data
+
+    if fmt == "csv":
+        # Header goes out before the query runs, so the client sees bytes at once
+        writer.writerow(columns)
+        yield take()
+    # Own session: the response body outlives the request's dependencies
+    async with AsyncSessionLocal() as db:
+        # Archived months in the range first (each in id order), then the hot table
+        months = await archived_months(db, model.__tablename__, date_from, date_to) if model.__tablename__ in ARCHIVED else []
+        for month in months + [None]:
+            async with attached(db, month) if month else nullcontext(model) as source:
+                result = await db.stream(stmt_for(source).execution_options(yield_per=EXPORT_BATCH_ROWS))
+                try:
+                    async for partition in result.partitions():
+                        for row in partition:
+                            values = [_value(v) for v in row]
+                            if fmt == "csv":
+                                writer.writerow(values)
+                            else:
+                                buffer.write(json.dumps(dict(zip(columns, values))))
+                                buffer.write("\n")
+                            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                                yield take()
+                finally:
+                    # Before DETACH, which fails while a cursor is open (e.g. the client went away)
+                    await result.close()
+    yield take(final=True)
+
+@router.get("/{resource}", response_model=None)
+async def export_rows(
+    request: Request,
+    resource: Literal["logs", "materials", "documents"],
+    format: Literal["csv", "ndjson"] = "csv",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    current_user = Depends(get_current_user)
+):
+    model, date_key, columns = EXPORTS[resource]
+    def stmt_for(source):
+        # `source` is the model or the same model mapped onto an archived month
+        stmt = select(*(getattr(source, c) for c in columns)).order_by(source.id)
+        date_column = getattr(source, date_key)
+        if date_from is not None:
+            stmt = stmt.where(date_column >= datetime.combine(date_from, time.min))
+        if date_to is not None:
+            # `to` is inclusive: everything before the next midnight
+            stmt = stmt.where(date_column < datetime.combine(date_to + timedelta(days=1), time.min))
+        if resource == "logs" and current_user.role == "Operator":
+            stmt = stmt.where(source.user_id == current_user.id)
+        return stmt
+    
+    gzip = accepts_gzip(request.headers.get("accept-encoding", ""))
+    # Vary either way: the same URL is sent compressed to some clients only
+    headers = {"Content-Disposition": f'attachment; filename="{resource}-{date.today().isoformat()}.{format}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_export_body(model, stmt_for, columns, format, gzip, date_from, date_to), media_type=MEDIA_TYPES[format], headers=headers)
\ No newline at end of file
@@ -1,13 +1,21 @@
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')  # Temp fix for imports
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from sqlalchemy import select, insert, func, cast, type_coerce, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import date, datetime, time, timedelta
 from pydantic import BaseModel
-from ..database import get_db
-from ..models import DailyLog, User
+from ..archive import archived_months, attached, paginate_archived
+from ..bulk import read_items, validate_item, summarize, get_replay, commit_with_key
+from ..etag import conditional
+from ..database import get_async_db, dialect_insert
+from ..models import DailyLog, DailyLogRollup, User
+from ..pagination import set_next_cursor
+from ..projection import parse_fields, parse_include, select_fields, row_dict
 from ..routers.auth import get_current_user
+from .documents import DocumentSummary, DOCUMENT_SUMMARY_FIELDS
 
 router = APIRouter(prefix="/logs", tags=["daily-logs"])
 
@@ -18,30 +26,233 @@ class DailyLogCreate(BaseModel):
     equipment_used: str
     fuel_consumed: float
 
+class DailyLogBulkItem(DailyLogCreate):
+    # Offline crews record the day the work happened, not the day they synced
+    date: Optional[datetime] = None
+
+# Every field is optional because `fields=` may project any subset
+class DailyLogRead(BaseModel):
+    id: int
+    date: Optional[datetime] = None
+    workers_count: Optional[int] = None
+    tasks: Optional[str] = None
+    hours_worked: Optional[float] = None
+    equipment_used: Optional[str] = None
+    fuel_consumed: Optional[float] = None
+    user_id: Optional[int] = None
+    documents: Optional[List[DocumentSummary]] = None  # include=documents
+
+LOG_FIELDS = ["id", "date", "workers_count", "tasks", "hours_worked", "equipment_used", "fuel_consumed", "user_id"]
+LOG_DEFAULT_FIELDS = ["id", "date", "workers_count"]
+LOG_INCLUDES = {"documents": DOCUMENT_SUMMARY_FIELDS}
+
+def _day(db: AsyncSession, column):
+    # SQLite stores Date as 'YYYY-MM-DD' text; CAST(... AS DATE) there would yield a number
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+def _totals(db: AsyncSession, model):
+    # Per (day, user) sums of one table of logs, hot or archived
+    day = type_coerce(_day(db, model.date), Date)
+    return select(
+        day, model.user_id, func.count(model.id),
+        func.coalesce(func.sum(model.workers_count), 0),
+        func.coalesce(func.sum(model.hours_worked), 0.0),
+        func.coalesce(func.sum(model.workers_count * model.hours_worked), 0.0),
+        func.coalesce(func.sum(model.fuel_consumed), 0.0),
+    ).where(model.date.is_not(None), model.user_id.is_not(None)).group_by(day, model.user_id)
+
+async def _ensure_rollups(db: AsyncSession):
+    # Backfilled once from the raw tables (e.g. on a database that predates rollups), then maintained incrementally
+    if await db.scalar(select(DailyLogRollup.day).limit(1)) is not None:
+        return
+    # Archived months first: ATTACH is refused once this transaction has written
+    totals = {}
+    for month in await archived_months(db, "daily_logs"):
+        async with attached(db, month) as archived_log:
+            rows = (await db.execute(_totals(db, archived_log))).all()
+        for row in rows:
+            _fold(totals, *row)
+    for row in (await db.execute(_totals(db, DailyLog))).all():
+        _fold(totals, *row)
+    if not totals:
+        return
+    # DO NOTHING: a concurrent request may have backfilled first
+    await db.execute(dialect_insert(DailyLogRollup).on_conflict_do_nothing(index_elements=["day", "user_id"]), list(totals.values()))
+
+def _fold(totals: dict, day, user_id, log_count, workers, hours, man_hours, fuel):
+    # A day can have rows in the hot table and in an archive (logs recorded late with an old date)
+    row = totals.setdefault((day, user_id), {"day": day, "user_id": user_id, "log_count": 0, "workers_sum": 0, "hours_sum": 0.0, "man_hours_sum": 0.0, "fuel_sum": 0.0})
+    row["log_count"] += log_count
+    row["workers_sum"] += workers
+    row["hours_sum"] += hours
+    row["man_hours_sum"] += man_hours
+    row["fuel_sum"] += fuel
+
+async def _add_to_rollups(db: AsyncSession, logs: List[dict]):
+    # Fold the new logs into their (day, user) rows: one upsert per touched day, not per log
+    totals = {}
+    for log in logs:
+        key = (log["date"].date(), log["user_id"])
+        row = totals.setdefault(key, {"day": key[0], "user_id": key[1], "log_count": 0, "workers_sum": 0, "hours_sum": 0.0, "man_hours_sum": 0.0, "fuel_sum": 0.0})
+        row["log_count"] += 1
+        row["workers_sum"] += log["workers_count"]
+        row["hours_sum"] += log["hours_worked"]
+        row["man_hours_sum"] += log["workers_count"] * log["hours_worked"]
+        row["fuel_sum"] += log["fuel_consumed"]
+    if not totals:
+        return
+    stmt = dialect_insert(DailyLogRollup)
+    stmt = stmt.on_conflict_do_update(index_elements=["day", "user_id"], set_={
+        column: getattr(DailyLogRollup, column) + getattr(stmt.excluded, column)
+        for column in ("log_count", "workers_sum", "hours_sum", "man_hours_sum", "fuel_sum")
+    })
+    await db.execute(stmt, list(totals.values()))
+
 @router.post("/", response_model=None)
-def create_daily_log(
+async def create_daily_log(
     log_data: DailyLogCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Role check: Allow Operator, SiteManager, PM, Admin
     if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
+    await _ensure_rollups(db)
     db_log = DailyLog(
         workers_count=log_data.workers_count,
         tasks=log_data.tasks,
         hours_worked=log_data.hours_worked,
         equipment_used=log_data.equipment_used,
         fuel_consumed=log_data.fuel_consumed,
-        user_id=current_user.id
+        user_id=current_user.id,
+        date=datetime.utcnow()
     )
     db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    await db.flush()
+    await _add_to_rollups(db, [{**log_data.dict(), "date": db_log.date, "user_id": current_user.id}])
+    await db.commit()
     return {"message": "Log created", "id": db_log.id}
 
-@router.get("/", response_model=None)
-def read_daily_logs(skip: int = 0, limit: int = 100, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    logs = db.query(DailyLog).filter(DailyLog.user_id == current_user.id).offset(skip).limit(limit).all()
-    return [{"id": log.id, "date": log.date, "workers_count": log.workers_count} for log in logs]
\ No newline at end of file
+@router.post("/bulk", response_model=None)
+async def create_daily_logs_bulk(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    
+    replay = await get_replay(db, current_user.id, "logs/bulk", idempotency_key)
+    if replay is not None:
+        return replay
+    
+    results, rows = [], []
+    for index, raw in enumerate(await read_items(request)):
+        item, errors = validate_item(DailyLogBulkItem, raw)
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        row = item.dict()
+        row["date"] = row["date"] or datetime.utcnow()
+        row["user_id"] = current_user.id
+        rows.append((index, row))
+    
+    if rows:
+        await _ensure_rollups(db)
+        # One executemany INSERT for the whole batch, inside a single transaction
+        stmt = insert(DailyLog).returning(DailyLog.id, sort_by_parameter_order=True)
+        ids = (await db.execute(stmt, [row for _, row in rows])).scalars().all()
+        results.extend({"index": index, "status": "created", "id": log_id} for (index, _), log_id in zip(rows, ids))
+        await _add_to_rollups(db, [row for _, row in rows])
+    
+    response = summarize(sorted(results, key=lambda r: r["index"]))
+    return await commit_with_key(db, current_user.id, "logs/bulk", idempotency_key, response)
+
+async def list_daily_logs(db: AsyncSession, user_id: int, cursor: Optional[str] = None, skip: int = 0, limit: int = 100, fields: List[str] = LOG_DEFAULT_FIELDS, include: dict = None, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    def stmt_for(model):
+        stmt = select_fields(model, fields, model.date, include=include).where(model.user_id == user_id)
+        if date_from is not None:
+            stmt = stmt.where(model.date >= datetime.combine(date_from, time.min))
+        if date_to is not None:
+            # `to` is inclusive: everything before the next midnight
+            stmt = stmt.where(model.date < datetime.combine(date_to + timedelta(days=1), time.min))
+        return stmt
+    # Archived months are only read when `from` reaches back into them
+    rows, next_cursor = await paginate_archived(db, "daily_logs", stmt_for, ["date", "id"], cursor, skip, limit, scalars=bool(include), date_from=date_from, date_to=date_to)
+    return [row_dict(row, fields, include) for row in rows], next_cursor
+
+@router.get("/", response_model=List[DailyLogRead], response_model_exclude_unset=True, dependencies=[Depends(conditional("daily_logs", "documents"))])
+async def read_daily_logs(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    logs, next_cursor = await list_daily_logs(db, current_user.id, cursor, skip, limit, parse_fields(fields, LOG_FIELDS, LOG_DEFAULT_FIELDS), parse_include(include, LOG_INCLUDES), date_from, date_to)
+    set_next_cursor(response, next_cursor)
+    return logs
+
+def _bucket(db: AsyncSession, bucket: str):
+    # Weeks start on Monday; months are labelled by their first day
+    if db.get_bind().dialect.name == "sqlite":
+        if bucket == "week":
+            return func.date(DailyLogRollup.day, "weekday 0", "-6 days")
+        if bucket == "month":
+            return func.strftime("%Y-%m-01", DailyLogRollup.day)
+        return DailyLogRollup.day
+    return cast(func.date_trunc(bucket, DailyLogRollup.day), Date)
+
+@router.get("/stats", response_model=None, dependencies=[Depends(conditional("daily_log_rollups"))])
+async def read_daily_log_stats(
+    bucket: Literal["day", "week", "month"] = "day",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    user_id: Optional[int] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Workers, hours and fuel per day/week/month, aggregated from the daily rollups."""
+    # Operators only see their own crew's numbers
+    if current_user.role == "Operator":
+        if user_id not in (None, current_user.id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+        user_id = current_user.id
+    
+    await _ensure_rollups(db)
+    period = _bucket(db, bucket).label("period")
+    stmt = select(
+        period,
+        func.sum(DailyLogRollup.log_count).label("log_count"),
+        func.sum(DailyLogRollup.workers_sum).label("workers"),
+        func.sum(DailyLogRollup.hours_sum).label("hours"),
+        func.sum(DailyLogRollup.man_hours_sum).label("man_hours"),
+        func.sum(DailyLogRollup.fuel_sum).label("fuel"),
+    ).group_by(period).order_by(period)
+    if date_from is not None:
+        stmt = stmt.where(DailyLogRollup.day >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(DailyLogRollup.day <= date_to)
+    if user_id is not None:
+        stmt = stmt.where(DailyLogRollup.user_id == user_id)
+    
+    rows = (await db.execute(stmt)).all()
+    await db.commit()  # persists a first-time backfill
+    return [{
+        "period": str(row.period),
+        "log_count": row.log_count,
+        "workers": row.workers,
+        "hours": round(row.hours, 2),
+        "man_hours": round(row.man_hours, 2),
+        "fuel": round(row.fuel, 2),
+        "avg_workers_per_log": round(row.workers / row.log_count, 2) if row.log_count else 0
+    } for row in rows]
\ No newline at end of file
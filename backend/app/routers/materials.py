@@ -1,17 +1,26 @@
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header, Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import datetime, timedelta
 from pydantic import BaseModel
-from ..database import get_db
-from ..models import Material
+from ..bulk import read_items, validate_item, summarize, get_replay, commit_with_key
+from ..etag import conditional, WEB_CONCURRENCY
+from ..database import get_async_db, dialect_insert, AsyncSessionLocal
+from ..metrics import timed
+from ..models import Material, OcrJob
+from ..ocr import run_ocr, parse_ocr_text, pdf_supported, OCR_WORKERS, OCR_MAX_QUEUED, OCR_JOB_TIMEOUT_SECONDS
+from ..ocr_cache import cache_key, get_cached, store as store_ocr_result
+from ..pagination import paginate, set_next_cursor
+from ..projection import parse_fields, parse_include, select_fields, row_dict
 from ..routers.auth import get_current_user
-from PIL import Image
-import pytesseract
-import re
-import io
+from ..storage import MAX_UPLOAD_BYTES, CHUNK_SIZE
+from .documents import DocumentSummary, DOCUMENT_SUMMARY_FIELDS
+import asyncio
 
 router = APIRouter(prefix="/materials", tags=["materials"])
 
@@ -27,94 +36,285 @@ class MaterialUpdate(BaseModel):
     non_conformity: Optional[bool] = None
     notes: Optional[str] = None
 
-def parse_ocr_text(text: str) -> dict:
-    ddt_match = re.search(r'DDT[:\s]*(\w+)', text, re.IGNORECASE)
-    batch_match = re.search(r'BATCH[:\s]*(\w+)', text, re.IGNORECASE)
+# Every field is optional because `fields=` may project any subset
+class MaterialRead(BaseModel):
+    id: int
+    ddt_number: Optional[str] = None
+    packing_list: Optional[str] = None
+    container_id: Optional[str] = None
+    batch_number: Optional[str] = None
+    non_conformity: Optional[bool] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    documents: Optional[List[DocumentSummary]] = None  # include=documents
+
+MATERIAL_FIELDS = ["id", "ddt_number", "packing_list", "container_id", "batch_number", "non_conformity", "notes", "created_at"]
+MATERIAL_LIST_FIELDS = ["id", "ddt_number", "batch_number", "non_conformity"]
+MATERIAL_DETAIL_FIELDS = ["id", "ddt_number", "packing_list", "container_id", "batch_number", "non_conformity", "notes"]
+MATERIAL_INCLUDES = {"documents": DOCUMENT_SUMMARY_FIELDS}
+
+def serialize_material(material: Material) -> dict:
     return {
-        'ddt_number': ddt_match.group(1) if ddt_match else None,
-        'batch_number': batch_match.group(1) if batch_match else None,
-        'full_text': text
+        "id": material.id,
+        "ddt_number": material.ddt_number,
+        "packing_list": material.packing_list,
+        "container_id": material.container_id,
+        "batch_number": material.batch_number,
+        "non_conformity": material.non_conformity,
+        "notes": material.notes
     }
 
+async def insert_material(db: AsyncSession, material_data: MaterialCreate) -> Material:
+    existing = await db.scalar(select(Material.id).where(Material.ddt_number == material_data.ddt_number))
+    if existing:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="DDT number already exists")
+    
+    db_material = Material(**material_data.dict())
+    db.add(db_material)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent insert of the same DDT
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="DDT number already exists")
+    return db_material
+
 @router.post("/", response_model=None)
-def create_material(
+async def create_material(
     material_data: MaterialCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
-    existing = db.query(Material).filter(Material.ddt_number == material_data.ddt_number).first()
-    if existing:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="DDT number already exists")
-    
-    db_material = Material(**material_data.dict())
-    db.add(db_material)
-    db.commit()
-    db.refresh(db_material)
+    db_material = await insert_material(db, material_data)
     return {"message": "Material created", "id": db_material.id}
 
-@router.post("/ocr/", response_model=None)
-async def create_material_from_ocr(
-    file: UploadFile = File(...),
+@router.post("/bulk", response_model=None)
+async def create_materials_bulk(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image files supported")
+    replay = await get_replay(db, current_user.id, "materials/bulk", idempotency_key)
+    if replay is not None:
+        return replay
+    
+    results, pending = [], {}
+    for index, raw in enumerate(await read_items(request)):
+        item, errors = validate_item(MaterialCreate, raw)
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+        elif item.ddt_number in pending:
+            results.append({"index": index, "status": "duplicate", "ddt_number": item.ddt_number})
+        else:
+            pending[item.ddt_number] = (index, item.dict())
     
-    contents = await file.read()
-    image = Image.open(io.BytesIO(contents))
-    text = pytesseract.image_to_string(image)
+    # One SELECT per chunk of DDT numbers instead of one per item
+    ddt_numbers = list(pending)
+    for start in range(0, len(ddt_numbers), 500):
+        chunk = ddt_numbers[start:start + 500]
+        for ddt_number in (await db.scalars(select(Material.ddt_number).where(Material.ddt_number.in_(chunk)))).all():
+            index, _ = pending.pop(ddt_number)
+            results.append({"index": index, "status": "duplicate", "ddt_number": ddt_number})
     
-    parsed = parse_ocr_text(text)
+    if pending:
+        # ON CONFLICT DO NOTHING covers rows inserted concurrently since the SELECT above
+        stmt = dialect_insert(Material).on_conflict_do_nothing(index_elements=["ddt_number"]).returning(Material.id, Material.ddt_number)
+        created = {ddt_number: material_id for material_id, ddt_number in (await db.execute(stmt, [row for _, row in pending.values()])).all()}
+        for ddt_number, (index, _) in pending.items():
+            if ddt_number in created:
+                results.append({"index": index, "status": "created", "id": created[ddt_number]})
+            else:
+                results.append({"index": index, "status": "duplicate", "ddt_number": ddt_number})
+    
+    response = summarize(sorted(results, key=lambda r: r["index"]))
+    return await commit_with_key(db, current_user.id, "materials/bulk", idempotency_key, response)
+
+# OCR jobs run in the background; job id -> task keeps them referenced until done
+_ocr_tasks = {}
+_ocr_slots = None
+UNFINISHED = ("pending", "running")
+INTERRUPTED = "Interrupted by a server restart, please upload the scan again"
+
+async def _fail_jobs(*criteria):
+    # The upload is gone with the process that held it, so the job cannot resume
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(OcrJob).where(OcrJob.status.in_(UNFINISHED), *criteria).values(
+            status="failed", error=INTERRUPTED, finished_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False))
+        await db.commit()
+
+async def fail_interrupted_jobs():
+    """Fail jobs left unfinished by a stopped worker; runs at startup.
+
+    A single worker owns every job, so all unfinished ones are orphans. With
+    several, another worker may still be running its jobs, so only those past
+    OCR_JOB_TIMEOUT_SECONDS are failed (job polls apply the same rule).
+    """
+    if WEB_CONCURRENCY <= 1:
+        await _fail_jobs()
+    else:
+        await _fail_jobs(OcrJob.created_at < datetime.utcnow() - timedelta(seconds=OCR_JOB_TIMEOUT_SECONDS))
+
+async def stop_ocr_jobs():
+    """Cancel this process's jobs on shutdown; each one is marked failed."""
+    tasks = list(_ocr_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _material_from_ocr(db: AsyncSession, parsed: dict, filename: str) -> Material:
     if not parsed['ddt_number']:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No DDT number detected")
-    
-    material_data = MaterialCreate(
+    return await insert_material(db, MaterialCreate(
         ddt_number=parsed['ddt_number'],
         packing_list=parsed['full_text'][:500],
         batch_number=parsed['batch_number'] or "UNKNOWN",
-        notes=f"OCR extracted from {file.filename}"
-    )
-    
-    return create_material(material_data, current_user, db)
+        notes=f"OCR extracted from {filename}"
+    ))
 
-@router.get("/", response_model=None)
-def read_materials(skip: int = 0, limit: int = 100, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    materials = db.query(Material).offset(skip).limit(limit).all()
-    return [{"id": m.id, "ddt_number": m.ddt_number, "batch_number": m.batch_number, "non_conformity": m.non_conformity} for m in materials]
+async def _read_upload(file: UploadFile) -> bytes:
+    # The scan is held in memory until its job finishes, so cap it while reading
+    chunks, size = [], 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
 
-@router.get("/{material_id}", response_model=None)
-def read_material(material_id: int, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    material = db.query(Material).filter(Material.id == material_id).first()
-    if not material:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
+async def _run_ocr_job(job_id: int, filename: str, key: str, contents: bytes):
+    global _ocr_slots
+    if _ocr_slots is None:
+        _ocr_slots = asyncio.Semaphore(OCR_WORKERS)
+    try:
+        async with _ocr_slots, AsyncSessionLocal() as db:
+            job = await db.get(OcrJob, job_id)
+            job.status = "running"
+            await db.commit()
+            try:
+                with timed("ocr"):
+                    text = await run_ocr(contents)
+                parsed = parse_ocr_text(text)
+                await store_ocr_result(db, key, parsed)
+                material = await _material_from_ocr(db, parsed, filename)
+                job = await db.get(OcrJob, job_id)
+                job.status, job.material_id, job.raw_text = "done", material.id, text
+            except Exception as e:
+                await db.rollback()
+                job = await db.get(OcrJob, job_id)
+                job.status = "failed"
+                job.error = e.detail if isinstance(e, HTTPException) else (str(e) or type(e).__name__)
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+    except asyncio.CancelledError:
+        # Shutting down (stop_ocr_jobs)
+        await _fail_jobs(OcrJob.id == job_id)
+        raise
+
+@router.post("/ocr/", response_model=None, status_code=status.HTTP_202_ACCEPTED)
+async def create_material_from_ocr(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user.role not in ["Operator", "SiteManager", "PM", "Admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    
+    if file.filename.lower().endswith('.pdf'):
+        if not pdf_supported():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="PDF OCR requires pypdfium2 to be installed")
+    elif not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image or PDF files supported")
+    
+    if len(_ocr_tasks) >= OCR_MAX_QUEUED:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="OCR queue is full, retry later")
+    
+    # Reject oversized uploads up front when the client declares the size
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+    
+    contents = await _read_upload(file)
+    key = cache_key(contents)
+    cached = await get_cached(db, key)
+    if cached is not None:
+        # Known scan: the duplicate-DDT check runs before any OCR work is spent
+        parsed = {'ddt_number': cached.ddt_number, 'batch_number': cached.batch_number, 'full_text': cached.raw_text}
+        material = await _material_from_ocr(db, parsed, file.filename)
+        job = OcrJob(status="done", filename=file.filename, raw_text=cached.raw_text, user_id=current_user.id, material_id=material.id, finished_at=datetime.utcnow())
+        db.add(job)
+        await db.commit()
+        return {"message": "OCR result reused from cache", "job_id": job.id, "status": job.status, "material_id": material.id}
+    
+    job = OcrJob(status="pending", filename=file.filename, user_id=current_user.id)
+    db.add(job)
+    await db.commit()
+    
+    task = asyncio.create_task(_run_ocr_job(job.id, file.filename, key, contents))
+    _ocr_tasks[job.id] = task
+    task.add_done_callback(lambda _, job_id=job.id: _ocr_tasks.pop(job_id, None))
+    return {"message": "OCR job queued", "job_id": job.id, "status": job.status}
+
+# Rolls over every minute too, so a poll on an orphaned job reaches the timeout check
+@router.get("/ocr/jobs/{job_id}", response_model=None, dependencies=[Depends(conditional("ocr_jobs", "materials", clock_seconds=60))])
+async def read_ocr_job(job_id: int, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(OcrJob, job_id)
+    if not job or (job.user_id != current_user.id and current_user.role == "Operator"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="OCR job not found")
+    if job.status in UNFINISHED and job.id not in _ocr_tasks and job.created_at < datetime.utcnow() - timedelta(seconds=OCR_JOB_TIMEOUT_SECONDS):
+        # Orphaned by a worker that stopped; no process will finish it. A job
+        # still running here is only slow (e.g. queued behind a long backlog)
+        await _fail_jobs(OcrJob.id == job_id)
+        await db.refresh(job)
+    material = await db.get(Material, job.material_id) if job.material_id else None
     return {
-        "id": material.id,
-        "ddt_number": material.ddt_number,
-        "packing_list": material.packing_list,
-        "container_id": material.container_id,
-        "batch_number": material.batch_number,
-        "non_conformity": material.non_conformity,
-        "notes": material.notes
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "material": serialize_material(material) if material else None
     }
 
+async def list_materials(db: AsyncSession, cursor: Optional[str] = None, skip: int = 0, limit: int = 100, fields: List[str] = MATERIAL_LIST_FIELDS, include: dict = None):
+    stmt = select_fields(Material, fields, Material.created_at, include=include)
+    rows, next_cursor = await paginate(db, stmt, [Material.created_at, Material.id], cursor, skip, limit, scalars=bool(include))
+    return [row_dict(row, fields, include) for row in rows], next_cursor
+
+@router.get("/", response_model=List[MaterialRead], response_model_exclude_unset=True, dependencies=[Depends(conditional("materials", "documents"))])
+async def read_materials(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, fields: Optional[str] = None, include: Optional[str] = None, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    materials, next_cursor = await list_materials(db, cursor, skip, limit, parse_fields(fields, MATERIAL_FIELDS, MATERIAL_LIST_FIELDS), parse_include(include, MATERIAL_INCLUDES))
+    set_next_cursor(response, next_cursor)
+    return materials
+
+@router.get("/{material_id}", response_model=MaterialRead, response_model_exclude_unset=True, dependencies=[Depends(conditional("materials", "documents"))])
+async def read_material(material_id: int, fields: Optional[str] = None, include: Optional[str] = None, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    fields, include = parse_fields(fields, MATERIAL_FIELDS, MATERIAL_DETAIL_FIELDS), parse_include(include, MATERIAL_INCLUDES)
+    result = await db.execute(select_fields(Material, fields, include=include).where(Material.id == material_id))
+    row = result.scalars().first() if include else result.first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
+    return row_dict(row, fields, include)
+
 @router.put("/{material_id}", response_model=None)
-def update_material(
+async def update_material(
     material_id: int,
     material_update: MaterialUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = await db.get(Material, material_id)
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material not found")
     
@@ -122,6 +322,5 @@ def update_material(
     for field, value in update_data.items():
         setattr(material, field, value)
     
-    db.commit()
-    db.refresh(material)
+    await db.commit()
     return {"message": "Material updated", "id": material_id}
\ No newline at end of file
@@ -1,13 +1,17 @@
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from sqlalchemy import select, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
-from ..database import get_db
-from ..models import ProjectProgress
+from ..etag import conditional
+from ..database import get_async_db, dialect_insert
+from ..models import ProjectProgress, ProgressSummary
+from ..pagination import paginate, set_next_cursor
+from ..projection import parse_fields, select_fields, row_dict
 from ..routers.auth import get_current_user
 
 router = APIRouter(prefix="/progress", tags=["progress-dashboard"])
@@ -25,20 +29,88 @@ class ProgressUpdate(BaseModel):
     actual_date: Optional[datetime] = None
     notes: Optional[str] = None
 
-def compute_gantt_data(progress: List[ProjectProgress]) -> dict:
-    overall_percent = sum(p.progress_percent for p in progress) / len(progress) if progress else 0
-    overdue = [p for p in progress if p.target_date and (p.actual_date or datetime.utcnow()) > p.target_date]
+# Every field is optional because `fields=` may project any subset
+class ProgressRead(BaseModel):
+    id: int
+    kpi_name: Optional[str] = None
+    progress_percent: Optional[float] = None
+    target_date: Optional[datetime] = None
+    actual_date: Optional[datetime] = None
+    notes: Optional[str] = None
+
+class Milestone(BaseModel):
+    name: str
+    progress: float
+    target: Optional[str] = None
+    actual: Optional[str] = None
+
+class DashboardSummary(BaseModel):
+    overall_progress_percent: float
+    overdue_milestones: int
+    kpi_count: int
+    milestones: List[Milestone]
+
+class ProgressPage(BaseModel):
+    kpis: List[ProgressRead]
+    dashboard_summary: DashboardSummary
+
+PROGRESS_FIELDS = ["id", "kpi_name", "progress_percent", "target_date", "actual_date", "notes"]
+PROGRESS_DEFAULT_FIELDS = ["id", "kpi_name", "progress_percent", "target_date", "actual_date"]
+
+def _completed_late(target_date, actual_date) -> int:
+    return int(bool(target_date and actual_date and actual_date > target_date))
+
+async def _ensure_summary(db: AsyncSession) -> bool:
+    # Built once from the full table (e.g. on a database that predates the summary), then maintained incrementally
+    if await db.get(ProgressSummary, 1) is not None:
+        return False
+    totals = select(
+        func.count(ProjectProgress.id),
+        func.coalesce(func.sum(ProjectProgress.progress_percent), 0.0),
+        func.coalesce(func.sum(case((ProjectProgress.actual_date > ProjectProgress.target_date, 1), else_=0)), 0),
+    )
+    kpi_count, progress_sum, completed_late = (await db.execute(totals)).one()
+    await db.execute(dialect_insert(ProgressSummary).values(
+        id=1, kpi_count=kpi_count, progress_sum=progress_sum, completed_late=completed_late
+    ).on_conflict_do_nothing(index_elements=["id"]))
+    return True
+
+async def _adjust_summary(db: AsyncSession, count: int = 0, progress: float = 0.0, late: int = 0):
+    await _ensure_summary(db)
+    await db.execute(update(ProgressSummary).where(ProgressSummary.id == 1).values(
+        kpi_count=ProgressSummary.kpi_count + count,
+        progress_sum=ProgressSummary.progress_sum + progress,
+        completed_late=ProgressSummary.completed_late + late,
+    ))
+
+async def read_summary(db: AsyncSession) -> dict:
+    """Project-wide KPIs: one summary-row read plus an index range count."""
+    if await _ensure_summary(db):
+        # Persist a first-time backfill right away, so later reads skip it and
+        # the write lock is not held for the rest of the request
+        await db.commit()
+    summary = (await db.execute(select(ProgressSummary.kpi_count, ProgressSummary.progress_sum, ProgressSummary.completed_late).where(ProgressSummary.id == 1))).one()
+    # Open milestones become overdue with the clock, so they are counted rather than maintained
+    open_overdue = await db.scalar(select(func.count()).select_from(ProjectProgress).where(
+        ProjectProgress.actual_date.is_(None), ProjectProgress.target_date < datetime.utcnow()
+    ))
     return {
-        "overall_progress_percent": round(overall_percent, 2),
-        "overdue_milestones": len(overdue),
+        "overall_progress_percent": round(summary.progress_sum / summary.kpi_count, 2) if summary.kpi_count else 0,
+        "overdue_milestones": summary.completed_late + open_overdue,
+        "kpi_count": summary.kpi_count
+    }
+
+def compute_gantt_data(progress: List[ProjectProgress], summary: dict) -> dict:
+    return {
+        **summary,
         "milestones": [{"name": p.kpi_name, "progress": p.progress_percent, "target": p.target_date.isoformat() if p.target_date else None, "actual": p.actual_date.isoformat() if p.actual_date else None} for p in progress]
     }
 
 @router.post("/", response_model=None)
-def create_progress(
+async def create_progress(
     progress_data: ProgressCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
@@ -48,40 +120,54 @@ def create_progress(
     
     db_progress = ProjectProgress(**progress_data.dict())
     db.add(db_progress)
-    db.commit()
-    db.refresh(db_progress)
+    await _adjust_summary(db, count=1, progress=db_progress.progress_percent, late=_completed_late(db_progress.target_date, db_progress.actual_date))
+    await db.commit()
     return {"message": "KPI created", "id": db_progress.id}
 
-@router.get("/", response_model=None)
-def read_progress(skip: int = 0, limit: int = 100, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    progress = db.query(ProjectProgress).offset(skip).limit(limit).all()
-    gantt_data = compute_gantt_data(progress)
+async def list_progress(db: AsyncSession, cursor: Optional[str] = None, skip: int = 0, limit: int = 100, fields: List[str] = PROGRESS_DEFAULT_FIELDS):
+    # The milestone chart always needs these, whatever the KPI projection
+    stmt = select_fields(ProjectProgress, fields, ProjectProgress.kpi_name, ProjectProgress.progress_percent, ProjectProgress.target_date, ProjectProgress.actual_date)
+    progress, next_cursor = await paginate(db, stmt, [ProjectProgress.id], cursor, skip, limit, scalars=False)
+    gantt_data = compute_gantt_data(progress, await read_summary(db))
     return {
-        "kpis": [{"id": p.id, "kpi_name": p.kpi_name, "progress_percent": p.progress_percent, "target_date": p.target_date.isoformat() if p.target_date else None, "actual_date": p.actual_date.isoformat() if p.actual_date else None} for p in progress],
+        "kpis": [row_dict(p, fields) for p in progress],
         "dashboard_summary": gantt_data
-    }
+    }, next_cursor
+
+# Overdue counts move with the clock, so the ETag also rolls over every minute
+@router.get("/", response_model=ProgressPage, response_model_exclude_unset=True, dependencies=[Depends(conditional("project_progress", "progress_summary", clock_seconds=60))])
+async def read_progress(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, fields: Optional[str] = None, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    progress, next_cursor = await list_progress(db, cursor, skip, limit, parse_fields(fields, PROGRESS_FIELDS, PROGRESS_DEFAULT_FIELDS))
+    set_next_cursor(response, next_cursor)
+    return progress
 
 @router.put("/{progress_id}", response_model=None)
-def update_progress(
+async def update_progress(
     progress_id: int,
     progress_update: ProgressUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role not in ["SiteManager", "PM", "Admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
     
-    progress = db.query(ProjectProgress).filter(ProjectProgress.id == progress_id).first()
-    if not progress:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="KPI not found")
-    
     update_data = progress_update.dict(exclude_unset=True)
     if "progress_percent" in update_data and update_data["progress_percent"] > 100:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Progress % cannot exceed 100")
     
+    # The delta is taken from the old values, so they must be read inside the
+    # write transaction: claiming the summary row first takes the write lock on
+    # SQLite and a row lock on PostgreSQL, and concurrent updates then see each
+    # other's committed values instead of both applying a delta to the same one
+    await _adjust_summary(db)
+    progress = await db.get(ProjectProgress, progress_id, with_for_update=True)
+    if not progress:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="KPI not found")
+    
+    old_percent, old_late = progress.progress_percent, _completed_late(progress.target_date, progress.actual_date)
     for field, value in update_data.items():
         setattr(progress, field, value)
     
-    db.commit()
-    db.refresh(progress)
+    await _adjust_summary(db, progress=progress.progress_percent - old_percent, late=_completed_late(progress.target_date, progress.actual_date) - old_late)
+    await db.commit()
     return {"message": "KPI updated", "id": progress_id}
\ No newline at end of file
@@ -0,0 +1,61 @@
+import sys
+sys.path.insert(0, r'E:\pv-clean\backend')
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select, func, literal, literal_column, union_all, table, column, Integer, String, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+from ..etag import conditional
+from ..database import get_async_db
+from ..models import DailyLog
+from ..pagination import paginate, set_next_cursor
+from ..routers.auth import get_current_user
+from ..search import match_expression, search_supported
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+# FTS5 index tables (see app/search.py); not part of the ORM metadata
+materials_fts = table("materials_fts", column("rowid", Integer))
+daily_logs_fts = table("daily_logs_fts", column("rowid", Integer))
+
+def _hits(kind: str, fts, match: str):
+    index = literal_column(fts.name)
+    return select(
+        literal(kind, String).label("type"),
+        fts.c.rowid.label("id"),
+        # bm25: lower is more relevant
+        func.bm25(index, type_=Float).label("rank"),
+        func.snippet(index, -1, "[", "]", "...", 12, type_=String).label("snippet"),
+    ).where(index.match(match))
+
+@router.get("", response_model=None, dependencies=[Depends(conditional("materials", "daily_logs", "ocr_jobs"))])
+async def search(
+    response: Response,
+    q: str,
+    kind: Optional[Literal["material", "log"]] = Query(None, alias="type"),
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not search_supported(db.get_bind()):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Full-text search requires SQLite")
+    match = match_expression(q)
+    if match is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query has no searchable words")
+    
+    branches = []
+    if kind in (None, "material"):
+        branches.append(_hits("material", materials_fts, match))
+    if kind in (None, "log"):
+        log_hits = _hits("log", daily_logs_fts, match)
+        # Operators only find their own logs
+        if current_user.role == "Operator":
+            log_hits = log_hits.where(daily_logs_fts.c.rowid.in_(select(DailyLog.id).where(DailyLog.user_id == current_user.id)))
+        branches.append(log_hits)
+    
+    hits = union_all(*branches).subquery("hits")
+    rows, next_cursor = await paginate(db, select(hits), [hits.c.rank, hits.c.type, hits.c.id], cursor, skip, limit, scalars=False)
+    set_next_cursor(response, next_cursor)
+    return [{"type": row.type, "id": row.id, "rank": row.rank, "snippet": row.snippet} for row in rows]
@@ -0,0 +1,114 @@
+import sys
+sys.path.insert(0, r'E:\pv-clean\backend')
+
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from ..database import get_async_db
+from ..etag import conditional
+from ..models import Document, Material, ProjectProgress, SyncCounter, Tombstone
+from ..pagination import encode_cursor, decode_cursor
+from ..projection import select_fields
+from ..routers.auth import get_current_user
+from ..sync import SYNCED_TABLES
+from .documents import DOCUMENT_FIELDS
+from .materials import MATERIAL_FIELDS
+from .progress import PROGRESS_FIELDS
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+# Delta sync for offline clients. The token is the position of the last change
+# sent, (row version, source, id), where a source is one resource's rows or its
+# tombstones; each call returns the next changes in that order, so traffic
+# scales with what changed rather than with the size of the tables.
+#
+#     GET /sync                  -> full: true, first batch of every row
+#     GET /sync?since=<token>    -> changes since then; repeat while more is true
+#
+# A response with full: true replaces the client's copy (first sync, or a token
+# older than the tombstones still kept).
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 500))
+SYNC_MAX_BATCH = int(os.getenv("SYNC_MAX_BATCH", 5000))
+
+SYNC_RESOURCES = {
+    "materials": (Material, MATERIAL_FIELDS + ["updated_at"]),
+    "progress": (ProjectProgress, PROGRESS_FIELDS + ["updated_at"]),
+    "documents": (Document, DOCUMENT_FIELDS + ["updated_at"]),
+}
+SOURCES = [(name, deleted) for name in SYNC_RESOURCES for deleted in (False, True)]
+TOKEN_COLUMNS = [Tombstone.row_version, Tombstone.id, Tombstone.row_id]  # version, source, id
+
+def _decode_token(token: str) -> list:
+    position = decode_cursor(token, TOKEN_COLUMNS)
+    if not all(isinstance(value, int) for value in position):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    return position
+
+def _after(version_column, id_column, source: int, position: list):
+    # Keyset on (row version, source, id); the source part is a constant per query
+    version, token_source, token_id = position
+    if source < token_source:
+        return version_column > version
+    if source > token_source:
+        return version_column >= version
+    return or_(version_column > version, and_(version_column == version, id_column > token_id))
+
+async def _fetch(db: AsyncSession, source: int, position: list, upto: int, limit: int) -> list:
+    name, deleted = SOURCES[source]
+    model, fields = SYNC_RESOURCES[name]
+    if deleted:
+        stmt = select(Tombstone.id, Tombstone.row_id, Tombstone.row_version).where(Tombstone.resource == model.__tablename__)
+        version_column, id_column = Tombstone.row_version, Tombstone.id
+    else:
+        stmt = select_fields(model, fields, model.row_version)
+        version_column, id_column = model.row_version, model.id
+    stmt = stmt.where(_after(version_column, id_column, source, position), version_column <= upto)
+    rows = (await db.execute(stmt.order_by(version_column, id_column).limit(limit))).all()
+    return [(row.row_version, source, getattr(row, id_column.key), row) for row in rows]
+
+@router.get("", response_model=None, dependencies=[Depends(conditional(*SYNCED_TABLES, "tombstones"))])
+async def read_changes(
+    since: Optional[str] = None,
+    limit: int = Query(SYNC_BATCH_SIZE, ge=1, le=SYNC_MAX_BATCH),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    counter = (await db.execute(select(SyncCounter.version, SyncCounter.pruned_version).where(SyncCounter.id == 1))).first()
+    # Every version up to the counter's committed value is committed too, so
+    # capping all queries at it gives one consistent cut across the tables
+    current, pruned = counter if counter else (0, 0)
+    position = _decode_token(since) if since else None
+    full = position is None or position[0] < pruned
+    if full:
+        position = [0, -1, 0]
+
+    changes = []
+    for source, (_, deleted) in enumerate(SOURCES):
+        # A full sync starts from an empty copy: nothing to delete
+        if not (deleted and full):
+            changes += await _fetch(db, source, position, current, limit + 1)
+    changes.sort(key=lambda change: change[:3])
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    resources = {}
+    for _, source, _, row in changes:
+        name, deleted = SOURCES[source]
+        fields = SYNC_RESOURCES[name][1]
+        batch = resources.setdefault(name, {"fields": fields, "rows": [], "deleted": []})
+        if deleted:
+            batch["deleted"].append(row.row_id)
+        else:
+            batch["rows"].append([getattr(row, f) for f in fields])
+    for batch in resources.values():
+        # SQLite may reuse a deleted id; the live row is always the newer change
+        live = {row[0] for row in batch["rows"]}
+        batch["deleted"] = [row_id for row_id in batch["deleted"] if row_id not in live]
+
+    if more:
+        token = encode_cursor(changes[-1][:3])
+    else:
+        token = encode_cursor([current, len(SOURCES), 0])
+    return {"token": token, "full": full, "more": more, "changes": resources}
@@ -0,0 +1,103 @@
+import re
+import sys
+from sqlalchemy import text
+
+# Full-text search over materials (including the complete OCR text of their
+# delivery notes) and daily log tasks/equipment, backed by SQLite FTS5. The
+# index tables live outside the ORM metadata and are kept in sync by triggers,
+# so bulk inserts and raw SQL writes are covered as well as ORM flushes.
+
+SEARCH_MAX_TERMS = 16
+
+# materials_fts holds its own copy of the text because ocr_text is gathered
+# from ocr_jobs; daily_logs_fts reads its columns from daily_logs directly.
+_TABLES = {
+    "materials_fts": "CREATE VIRTUAL TABLE materials_fts USING fts5("
+                     "ddt_number, batch_number, container_id, packing_list, notes, ocr_text, "
+                     "tokenize = 'unicode61 remove_diacritics 2')",
+    "daily_logs_fts": "CREATE VIRTUAL TABLE daily_logs_fts USING fts5("
+                      "tasks, equipment_used, content = 'daily_logs', content_rowid = 'id', "
+                      "tokenize = 'unicode61 remove_diacritics 2')",
+}
+
+_MATERIAL_OCR_TEXT = "(SELECT group_concat(raw_text, ' ') FROM ocr_jobs WHERE material_id = {id})"
+
+_MATERIAL_ROW = (
+    "INSERT INTO materials_fts(rowid, ddt_number, batch_number, container_id, packing_list, notes, ocr_text) "
+    "VALUES (new.id, new.ddt_number, new.batch_number, new.container_id, new.packing_list, new.notes, "
+    + _MATERIAL_OCR_TEXT.format(id="new.id") + ");"
+)
+
+_TRIGGERS = {
+    "materials_fts_ai": "AFTER INSERT ON materials BEGIN " + _MATERIAL_ROW + " END",
+    "materials_fts_au": "AFTER UPDATE ON materials BEGIN DELETE FROM materials_fts WHERE rowid = old.id; " + _MATERIAL_ROW + " END",
+    "materials_fts_ad": "AFTER DELETE ON materials BEGIN DELETE FROM materials_fts WHERE rowid = old.id; END",
+    # OCR text reaches a material when its job finishes (or is recorded already done)
+    "ocr_jobs_fts_ai": "AFTER INSERT ON ocr_jobs WHEN new.material_id IS NOT NULL BEGIN "
+                       "UPDATE materials_fts SET ocr_text = " + _MATERIAL_OCR_TEXT.format(id="new.material_id")
+                       + " WHERE rowid = new.material_id; END",
+    "ocr_jobs_fts_au": "AFTER UPDATE OF material_id, raw_text ON ocr_jobs BEGIN "
+                       "UPDATE materials_fts SET ocr_text = " + _MATERIAL_OCR_TEXT.format(id="materials_fts.rowid")
+                       + " WHERE rowid IN (old.material_id, new.material_id); END",
+    "daily_logs_fts_ai": "AFTER INSERT ON daily_logs BEGIN "
+                         "INSERT INTO daily_logs_fts(rowid, tasks, equipment_used) VALUES (new.id, new.tasks, new.equipment_used); END",
+    "daily_logs_fts_au": "AFTER UPDATE OF tasks, equipment_used ON daily_logs BEGIN "
+                         "INSERT INTO daily_logs_fts(daily_logs_fts, rowid, tasks, equipment_used) VALUES ('delete', old.id, old.tasks, old.equipment_used); "
+                         "INSERT INTO daily_logs_fts(rowid, tasks, equipment_used) VALUES (new.id, new.tasks, new.equipment_used); END",
+    "daily_logs_fts_ad": "AFTER DELETE ON daily_logs BEGIN "
+                         "INSERT INTO daily_logs_fts(daily_logs_fts, rowid, tasks, equipment_used) VALUES ('delete', old.id, old.tasks, old.equipment_used); END",
+}
+
+def search_supported(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+def rebuild(conn):
+    """Repopulate both indexes from their source tables."""
+    conn.execute(text("DELETE FROM materials_fts"))
+    conn.execute(text(
+        "INSERT INTO materials_fts(rowid, ddt_number, batch_number, container_id, packing_list, notes, ocr_text) "
+        "SELECT m.id, m.ddt_number, m.batch_number, m.container_id, m.packing_list, m.notes, "
+        + _MATERIAL_OCR_TEXT.format(id="m.id") + " FROM materials m"
+    ))
+    conn.execute(text("INSERT INTO daily_logs_fts(daily_logs_fts) VALUES ('rebuild')"))
+    for table in _TABLES:
+        conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('optimize')"))
+
+def install_search(conn):
+    # Idempotent: creates missing index tables and triggers, and fills any
+    # newly created index from the rows that already exist
+    if not search_supported(conn):
+        return
+    existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")).scalars())
+    created = [name for name in _TABLES if name not in existing]
+    for name in created:
+        conn.execute(text(_TABLES[name]))
+    for name, body in _TRIGGERS.items():
+        if name not in existing:
+            conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+    if created:
+        rebuild(conn)
+
+def match_expression(q: str):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Returns None when the text contains no searchable words. Quoting each term
+    keeps FTS5 operators and punctuation in user input from being interpreted.
+    """
+    terms = re.findall(r"\w+", q)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+if __name__ == "__main__":
+    # python -m app.search rebuild   (from the backend directory)
+    from .database import engine
+    from .migrations import migrate
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.search rebuild")
+    if not search_supported(engine):
+        sys.exit("Full-text search requires SQLite")
+    migrate()
+    with engine.begin() as conn:
+        rebuild(conn)
+    print("Search indexes rebuilt")
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+# Uploads are stored content-addressed: the blob key is the sha256 of its bytes,
+# so identical photos share one file and concurrent uploads never collide.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class StoredBlob:
+    digest: str
+    size: int
+    path: str
+    staged: Optional[str] = None  # where save() left the bytes until publish()
+
+class StorageBackend:
+    """Where document bytes live. Implement this for S3-compatible stores.
+
+    Uploads take two steps: save() receives the bytes into a staging area and
+    learns their digest, publish() then makes them readable under it. Callers
+    claim the blob's database row in between, so a publish never races the
+    delete() of a blob whose last reference just went away.
+    """
+
+    async def save(self, upload, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredBlob:
+        raise NotImplementedError
+
+    async def publish(self, blob: StoredBlob):
+        raise NotImplementedError
+
+    async def discard(self, blob: StoredBlob):
+        # Drop a staged upload that will not be published
+        raise NotImplementedError
+
+    async def delete(self, digest: str):
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        # Filesystem path for zero-copy serving; None when blobs are remote
+        return None
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    async def save(self, upload, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredBlob:
+        tmp_dir = os.path.join(self.root, "tmp")
+        await run_in_threadpool(os.makedirs, tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+        sha256, size = hashlib.sha256(), 0
+        out = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {max_bytes} bytes")
+                sha256.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        except BaseException:
+            await run_in_threadpool(out.close)
+            await run_in_threadpool(os.remove, tmp_path)
+            raise
+        await run_in_threadpool(out.close)
+
+        digest = sha256.hexdigest()
+        return StoredBlob(digest=digest, size=size, path=self._path(digest).replace(os.sep, "/"), staged=tmp_path)
+
+    async def publish(self, blob: StoredBlob):
+        path = self._path(blob.digest)
+        await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+        # Same digest means same bytes, so replacing an existing blob is harmless
+        await run_in_threadpool(os.replace, blob.staged, path)
+        blob.staged = None
+
+    async def discard(self, blob: StoredBlob):
+        if blob.staged is not None:
+            try:
+                await run_in_threadpool(os.remove, blob.staged)
+            except FileNotFoundError:
+                pass
+            blob.staged = None
+
+    async def delete(self, digest: str):
+        try:
+            await run_in_threadpool(os.remove, self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self._path(digest)
+
+storage: StorageBackend = LocalStorage()
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from .database import dialect_insert
+from .models import Document, Material, ProjectProgress, SyncCounter, Tombstone
+
+# Row versions for delta sync (GET /sync). Every transaction that writes a
+# synced table claims the next number from the sync_counter row and stamps it
+# on the rows it inserts or updates, and on a tombstone for each row it
+# deletes. Claiming the number locks the counter row until commit, so versions
+# become visible in order: once a client has seen version N, no transaction
+# can still commit a lower one. (SQLite serialises writers anyway; on
+# PostgreSQL this serialises transactions writing synced tables.)
+#
+# The hooks cover ORM sessions, including bulk INSERT/UPDATE/DELETE statements
+# run through a session. Core writes on a plain connection (seed_data.py) must
+# call next_version(conn) first; the column defaults then pick the number up.
+
+SYNCED_MODELS = [Material, ProjectProgress, Document]
+SYNCED_TABLES = {model.__tablename__: model for model in SYNCED_MODELS}
+# Clients holding a token older than the pruned tombstones must resync in full
+TOMBSTONE_TTL = timedelta(days=int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", 90)))
+
+def next_version(conn) -> int:
+    """Claim the next row version for the transaction running on `conn`."""
+    stmt = (
+        update(SyncCounter).where(SyncCounter.id == 1)
+        .values(version=SyncCounter.version + 1).returning(SyncCounter.version)
+    )
+    version = conn.execute(stmt).scalar()
+    if version is None:
+        # Counter row not created yet (migration 4 normally creates it)
+        conn.execute(dialect_insert(SyncCounter).values(id=1, version=0, pruned_version=0).on_conflict_do_nothing(index_elements=["id"]))
+        version = conn.execute(stmt).scalar()
+    return version
+
+def _version(session) -> int:
+    # One number per transaction, however many flushes and statements it runs
+    if "row_version" not in session.info:
+        session.info["row_version"] = next_version(session.connection())
+    return session.info["row_version"]
+
+def prune_tombstones(conn):
+    cutoff = datetime.utcnow() - TOMBSTONE_TTL
+    pruned = conn.execute(select(func.max(Tombstone.row_version)).where(Tombstone.deleted_at < cutoff)).scalar()
+    if pruned is not None:
+        conn.execute(delete(Tombstone).where(Tombstone.row_version <= pruned))
+        conn.execute(update(SyncCounter).where(SyncCounter.id == 1, SyncCounter.pruned_version < pruned).values(pruned_version=pruned))
+
+@event.listens_for(Session, "before_flush")
+def _stamp_rows(session, flush_context, instances):
+    written = [obj for obj in session.new if type(obj) in SYNCED_MODELS]
+    written += [obj for obj in session.dirty if type(obj) in SYNCED_MODELS and session.is_modified(obj, include_collections=False)]
+    deleted = [obj for obj in session.deleted if type(obj) in SYNCED_MODELS]
+    if not written and not deleted:
+        return
+    version, now = _version(session), datetime.utcnow()
+    for obj in written:
+        obj.row_version, obj.updated_at = version, now
+    if deleted:
+        prune_tombstones(session.connection())
+        session.add_all(
+            Tombstone(resource=obj.__tablename__, row_id=obj.id, row_version=version, deleted_at=now)
+            for obj in deleted
+        )
+
+@event.listens_for(Session, "do_orm_execute")
+def _stamp_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if getattr(table, "name", None) not in SYNCED_TABLES:
+        return
+    # Claimed before the statement runs, so the column defaults see it
+    version = _version(orm_execute_state.session)
+    if orm_execute_state.is_delete:
+        deleted_ids = select(literal(table.name), table.c.id, literal(version), literal(datetime.utcnow()))
+        if orm_execute_state.statement.whereclause is not None:
+            deleted_ids = deleted_ids.where(orm_execute_state.statement.whereclause)
+        conn = orm_execute_state.session.connection()
+        prune_tombstones(conn)
+        conn.execute(insert(Tombstone).from_select(["resource", "row_id", "row_version", "deleted_at"], deleted_ids))
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _release(session):
+    session.info.pop("row_version", None)
@@ -0,0 +1,87 @@
+import io
+import os
+import time
+import uuid
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from .ocr import is_pdf, pdf_supported
+from .storage import UPLOAD_DIR
+
+# Thumbnails are rendered on first request and cached on disk. Requested sizes
+# snap up to a fixed set so one photo never fans out into dozens of derivatives.
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join(UPLOAD_DIR, "thumbs"))
+THUMBNAIL_SIZES = (64, 128, 256, 512, 1024)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+THUMBNAIL_QUALITY = 80
+# Walking the cache directory is not free; only check the budget this often
+EVICTION_INTERVAL_SECONDS = 60
+
+_last_eviction = 0.0
+
+def snap_size(size: int) -> int:
+    for candidate in THUMBNAIL_SIZES:
+        if size <= candidate:
+            return candidate
+    return THUMBNAIL_SIZES[-1]
+
+def _render(source_path: str, target_path: str, size: int):
+    from PIL import Image, ImageOps
+    with open(source_path, "rb") as f:
+        contents = f.read()
+    if is_pdf(contents):
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(contents)
+        try:
+            page = pdf[0]
+            # Render near the target size rather than at print resolution
+            scale = size / max(page.get_size())
+            image = page.render(scale=max(scale, 0.05)).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(io.BytesIO(contents))
+        if image.format == "JPEG":
+            image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size))
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+    image.convert("RGB").save(tmp_path, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(tmp_path, target_path)
+
+def _evict():
+    # LRU by mtime (cache hits touch the file); oldest derivatives go first
+    entries, total = [], 0
+    for name in os.listdir(THUMBNAIL_DIR):
+        path = os.path.join(THUMBNAIL_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    for _, entry_size, path in sorted(entries):
+        if total <= THUMBNAIL_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= entry_size
+
+async def get_thumbnail(source_path: str, key: str, size: int, is_pdf_source: bool = False) -> str:
+    global _last_eviction
+    if is_pdf_source and not pdf_supported():
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="PDF thumbnails require pypdfium2 to be installed")
+    target_path = os.path.join(THUMBNAIL_DIR, f"{key}_{size}.jpg")
+    if os.path.exists(target_path):
+        await run_in_threadpool(os.utime, target_path)
+        return target_path
+    await run_in_threadpool(os.makedirs, THUMBNAIL_DIR, exist_ok=True)
+    try:
+        await run_in_threadpool(_render, source_path, target_path, size)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Cannot render thumbnail: {e}")
+    if time.monotonic() - _last_eviction > EVICTION_INTERVAL_SECONDS:
+        _last_eviction = time.monotonic()
+        await run_in_threadpool(_evict)
+    return target_path
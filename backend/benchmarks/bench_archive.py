@@ -0,0 +1,50 @@
+"""Archiving checks; each runs the app in a subprocess against its own database."""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IDS_NOT_REUSED = textwrap.dedent("""
+    import sqlite3
+    from fastapi.testclient import TestClient
+    from app.archive import archive_old_rows
+    from app.main import app
+
+    log = {"workers_count": 4, "tasks": "Trenching", "hours_worked": 8.0, "equipment_used": "Trencher", "fuel_consumed": 10.0}
+    with TestClient(app) as client:
+        token = client.post("/auth/register", json={"username": "admin", "password": "x", "role": "Admin"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        logs = [client.post("/logs/", json=log, headers=headers).json()["id"] for _ in range(3)]
+        docs = [client.post("/documents/", files={"file": (f"{i}.jpg", b"\\xff\\xd8old" + bytes([i]), "image/jpeg")}, headers=headers).json()["id"] for i in range(3)]
+
+        db = sqlite3.connect("pvdb.db")
+        db.execute("UPDATE daily_logs SET date = '2020-01-15 10:00:00'")
+        db.execute("UPDATE documents SET created_at = '2020-01-15 10:00:00'")
+        db.commit()
+        archive_old_rows()
+        assert db.execute("SELECT count(*) FROM daily_logs").fetchone()[0] == 0
+        assert db.execute("SELECT count(*) FROM documents").fetchone()[0] == 0
+
+        new_log = client.post("/logs/", json=log, headers=headers).json()["id"]
+        new_doc = client.post("/documents/", files={"file": ("new.jpg", b"\\xff\\xd8new", "image/jpeg")}, headers=headers).json()["id"]
+        assert new_log > max(logs), (new_log, logs)
+        assert new_doc > max(docs), (new_doc, docs)
+        # The archived document is still the one served under its id
+        assert client.get(f"/documents/{docs[0]}?fields=id,original_filename", headers=headers).json()["original_filename"] == "0.jpg"
+
+        # Deleting the newest row must not free its id either
+        client.delete(f"/documents/{new_doc}", headers=headers)
+        again = client.post("/documents/", files={"file": ("again.jpg", b"\\xff\\xd8again", "image/jpeg")}, headers=headers).json()["id"]
+        assert again > new_doc, (again, new_doc)
+""")
+
+
+def test_ids_not_reused_after_archiving_every_row():
+    work_dir = tempfile.mkdtemp(prefix="pv-archive-")
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR, "ARCHIVE_DIR": os.path.join(work_dir, "archive")}
+    env.pop("DATABASE_URL", None)
+    result = subprocess.run([sys.executable, "-c", IDS_NOT_REUSED], cwd=work_dir, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
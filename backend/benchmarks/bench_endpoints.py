@@ -0,0 +1,140 @@
+"""Per-endpoint latency benchmarks; see conftest.py for how to run them."""
+import io
+import itertools
+import time
+
+_ids = itertools.count()
+
+
+def _ok(response, status: int = 200):
+    assert response.status_code == status, response.text
+    return response
+
+
+# auth
+
+def test_login(benchmark, client):
+    benchmark(lambda: _ok(client.post("/auth/login", json={"username": "user2", "password": "testpass123"})))
+
+
+# logs
+
+def test_list_logs(benchmark, client, operator):
+    benchmark(lambda: _ok(client.get("/logs/?limit=100", headers=operator)))
+
+
+def test_list_logs_cursor_deep_page(benchmark, client, operator):
+    cursor = None
+    for _ in range(20):
+        next_cursor = _ok(client.get("/logs/?limit=100" + (f"&cursor={cursor}" if cursor else ""), headers=operator)).headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        cursor = next_cursor
+    benchmark(lambda: _ok(client.get(f"/logs/?limit=100&cursor={cursor}", headers=operator)))
+
+
+def test_logs_stats_month(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/logs/stats?bucket=month", headers=pm)))
+
+
+def test_create_log(benchmark, client, operator):
+    body = {"workers_count": 12, "tasks": "Module mounting", "hours_worked": 8.0, "equipment_used": "Telehandler", "fuel_consumed": 40.0}
+    benchmark(lambda: _ok(client.post("/logs/", json=body, headers=operator)))
+
+
+def test_bulk_logs_100(benchmark, client, operator):
+    items = [{"workers_count": i, "tasks": "Trenching", "hours_worked": 8.0, "equipment_used": "Trencher", "fuel_consumed": 12.5} for i in range(100)]
+    benchmark(lambda: _ok(client.post("/logs/bulk", json=items, headers=operator)))
+
+
+# materials
+
+def test_list_materials(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/materials/?limit=100", headers=pm)))
+
+
+def test_list_materials_heavy_fields(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/materials/?limit=100&fields=packing_list,notes,container_id", headers=pm)))
+
+
+def test_list_materials_include_documents(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/materials/?limit=100&include=documents", headers=pm)))
+
+
+def test_material_detail(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/materials/1?include=documents", headers=pm)))
+
+
+def test_create_material(benchmark, client, pm):
+    benchmark(lambda: _ok(client.post("/materials/", json={"ddt_number": f"BENCH{next(_ids)}", "batch_number": "B1"}, headers=pm)))
+
+
+def test_ocr_job_stubbed(benchmark, client, operator):
+    def submit_and_wait():
+        image = f"scan {next(_ids)}".encode()
+        job = _ok(client.post("/materials/ocr/", files={"file": ("note.png", image, "image/png")}, headers=operator), 202).json()
+        while job["status"] not in ("done", "failed"):
+            time.sleep(0.001)
+            job = _ok(client.get(f"/materials/ocr/jobs/{job['job_id']}", headers=operator)).json()
+        assert job["status"] == "done", job
+
+    benchmark.pedantic(submit_and_wait, rounds=50, warmup_rounds=2)
+
+
+# documents
+
+def test_list_documents_include_related(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/documents/?limit=100&include=material,daily_log", headers=pm)))
+
+
+def test_document_thumbnail(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/documents/1/thumbnail?size=256", headers=pm)))
+
+
+def test_upload_document(benchmark, client, operator):
+    def upload():
+        payload = io.BytesIO(b"\xff\xd8\xff" + str(next(_ids)).encode() * 4096)
+        _ok(client.post("/documents/?material_id=1", files={"file": ("photo.jpg", payload, "image/jpeg")}, headers=operator))
+
+    benchmark.pedantic(upload, rounds=100, warmup_rounds=2)
+
+
+# progress, dashboard, search, export
+
+def test_progress(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/progress/", headers=pm)))
+
+
+def test_dashboard(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/dashboard", headers=pm)))
+
+
+def test_conditional_get_not_modified(benchmark, client, pm):
+    etag = _ok(client.get("/materials/?limit=100", headers=pm)).headers["ETag"]
+    benchmark(lambda: _ok(client.get("/materials/?limit=100", headers={**pm, "If-None-Match": etag}), 304))
+
+
+def test_search(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/search?q=jinko&limit=20", headers=pm)))
+
+
+def test_export_logs_csv(benchmark, client, pm):
+    benchmark.pedantic(lambda: _ok(client.get("/export/logs?format=csv", headers=pm)), rounds=5, warmup_rounds=1)
+
+
+# sync: a full batch vs. a delta holding one change
+
+def test_sync_full_batch(benchmark, client, pm):
+    benchmark(lambda: _ok(client.get("/sync?limit=500", headers=pm)))
+
+
+def test_sync_delta_one_change(benchmark, client, pm):
+    token = None
+    while True:
+        page = _ok(client.get("/sync?limit=5000" + (f"&since={token}" if token else ""), headers=pm)).json()
+        token = page["token"]
+        if not page["more"]:
+            break
+    _ok(client.post("/materials/", json={"ddt_number": f"BENCH-SYNC-{time.time_ns()}", "batch_number": "B-1"}, headers=pm))
+    benchmark(lambda: _ok(client.get(f"/sync?since={token}", headers=pm)))
+
@@ -0,0 +1,23 @@
+"""Query-count checks for include=: related rows are loaded in one query per
+relation, however many parent rows a page holds (no N+1)."""
+
+
+def _ok(response, status: int = 200):
+    assert response.status_code == status, response.text
+    return response
+
+
+def test_include_query_count_is_constant(client, pm, sql_statements):
+    counts = []
+    for limit in (5, 100):
+        sql_statements.clear()
+        _ok(client.get(f"/materials/?limit={limit}&include=documents", headers=pm))
+        counts.append(len(sql_statements))
+    assert counts[0] == counts[1], counts
+
+    counts = []
+    for limit in (5, 100):
+        sql_statements.clear()
+        _ok(client.get(f"/documents/?limit={limit}&include=material,daily_log", headers=pm))
+        counts.append(len(sql_statements))
+    assert counts[0] == counts[1], counts
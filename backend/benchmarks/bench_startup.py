@@ -0,0 +1,23 @@
+"""Worker startup benchmarks; benchmarks/startup.py prints the per-module breakdown."""
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(code: str, cwd: str):
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {BACKEND_DIR!r}); {code}"], cwd=cwd, check=True)
+
+
+def test_import_app(benchmark):
+    work_dir = tempfile.mkdtemp(prefix="pv-startup-")
+    _python("import app.main", work_dir)
+    benchmark.pedantic(_python, args=("import app.main", work_dir), rounds=5, warmup_rounds=1)
+
+
+def test_import_and_migration_check(benchmark):
+    work_dir = tempfile.mkdtemp(prefix="pv-startup-")
+    _python("import app.main; app.main.migrate()", work_dir)
+    benchmark.pedantic(_python, args=("import app.main; app.main.migrate()", work_dir), rounds=5, warmup_rounds=1)
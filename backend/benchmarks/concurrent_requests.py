@@ -0,0 +1,145 @@
+"""Concurrent-request throughput and latency against the in-process app.
+
+Run from the backend directory:
+
+    python benchmarks/concurrent_requests.py --requests 2000 --concurrency 50
+    python benchmarks/concurrent_requests.py --scenario mixed --logs 100000 --json after.json
+
+A throwaway SQLite database is created in a temp directory and filled by
+seed_data.py (fixed --seed), so the development pvdb.db is never touched and
+runs are comparable between commits. `--scenario path` hammers one GET
+endpoint; `--scenario mixed` draws every request from a weighted mix of reads
+and writes across all routers. Failed requests (non-2xx, e.g. a "database is
+locked" 500 under concurrent writes) are counted per endpoint rather than
+aborting the run. --json writes the results for later diffing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "testpass123"  # seed_data.PASSWORD
+
+# name -> (weight, method, path or callable(n) -> path, json body or callable(n) -> body)
+MIXED = {
+    "list_logs": (20, "GET", "/logs/?limit=50", None),
+    "list_materials": (15, "GET", "/materials/?limit=50", None),
+    "material_detail": (10, "GET", lambda n: f"/materials/{1 + n % 500}?include=documents", None),
+    "list_documents": (10, "GET", "/documents/?limit=50&include=material", None),
+    "progress": (5, "GET", "/progress/", None),
+    "dashboard": (10, "GET", "/dashboard", None),
+    "logs_stats": (5, "GET", "/logs/stats?bucket=week", None),
+    "search": (10, "GET", lambda n: random.choice(["/search?q=jinko", "/search?q=crane", "/search?q=block 12"]), None),
+    "create_log": (10, "POST", "/logs/", {"workers_count": 10, "tasks": "Module mounting", "hours_worked": 8.0, "equipment_used": "Crane", "fuel_consumed": 20.0}),
+    "create_material": (5, "POST", "/materials/", lambda n: {"ddt_number": f"LOAD{n}-{time.time_ns()}", "batch_number": "B1"}),
+}
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run(requests: int, concurrency: int, scenario: str, path: str) -> dict:
+    import httpx
+    from app.main import app
+
+    # Unhandled app exceptions become 500s so they are counted, not raised
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post("/auth/login", json={"username": "user2", "password": PASSWORD})  # PM
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        names = list(MIXED)
+        weights = [MIXED[name][0] for name in names]
+        plan = [path] * requests if scenario == "path" else random.choices(names, weights, k=requests)
+        queue = asyncio.Queue()
+        for n, item in enumerate(plan):
+            queue.put_nowait((n, item))
+        latencies, errors = {}, {}
+
+        async def request(n: int, item: str):
+            if scenario == "path":
+                return "GET " + item, await client.get(item, headers=headers)
+            _, method, target, body = MIXED[item]
+            target = target(n) if callable(target) else target
+            body = body(n) if callable(body) else body
+            return item, await client.request(method, target, headers=headers, json=body)
+
+        async def worker():
+            while not queue.empty():
+                n, item = queue.get_nowait()
+                start = time.perf_counter()
+                name, resp = await request(n, item)
+                latencies.setdefault(name, []).append(time.perf_counter() - start)
+                if resp.status_code >= 300:
+                    errors[name] = errors.get(name, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "total": summarize([l for values in latencies.values() for l in values], sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(values, errors.get(name, 0), elapsed) for name, values in sorted(latencies.items())},
+    }
+
+
+def report(results: dict):
+    print(f"{results['total']['requests']} requests ({results['scenario']}) @ concurrency {results['concurrency']}")
+    print(f"  {'endpoint':<24}{'req':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in list(results["endpoints"].items()) + [("TOTAL", results["total"])]:
+        print(f"  {name:<24}{stats['requests']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    print(f"  throughput: {results['total']['throughput_rps']:8.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenario", choices=["path", "mixed"], default="path")
+    parser.add_argument("--path", default="/logs/")
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--materials", type=int, default=2000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--kpis", type=int, default=100)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    random.seed(1)
+    json_path = os.path.abspath(args.json) if args.json else None
+    work_dir = tempfile.mkdtemp(prefix="pv-bench-")
+    subprocess.run([
+        sys.executable, os.path.join(BACKEND_DIR, "seed_data.py"), "--users=4", "--seed=1",
+        f"--logs={args.logs}", f"--materials={args.materials}", f"--documents={args.documents}", f"--kpis={args.kpis}",
+    ], cwd=work_dir, check=True, capture_output=True)
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(work_dir)
+    results = asyncio.run(run(args.requests, args.concurrency, args.scenario, args.path))
+    report(results)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Fixtures for the endpoint benchmarks (benchmarks/bench_*.py).
+
+Run from the backend directory (needs pytest-benchmark):
+
+    python -m pytest benchmarks --benchmark-autosave     # save this run under .benchmarks/
+    python -m pytest benchmarks --benchmark-compare      # compare with the last saved run
+
+The app runs in-process against a throwaway SQLite database filled by
+seed_data.py with a fixed --seed, and Tesseract is replaced by a stub, so no
+external services are needed and runs are comparable between commits.
+Volumes can be raised with BENCH_LOGS, BENCH_MATERIALS, BENCH_DOCUMENTS and
+BENCH_KPIS.
+
+pytest-benchmark has no percentile columns, so p95/p99 per round are printed in
+a table of their own after its results and added to the stats of saved runs.
+"""
+import hashlib
+import math
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOLUMES = {
+    "logs": int(os.getenv("BENCH_LOGS", 20000)),
+    "materials": int(os.getenv("BENCH_MATERIALS", 5000)),
+    "documents": int(os.getenv("BENCH_DOCUMENTS", 5000)),
+    "kpis": int(os.getenv("BENCH_KPIS", 200)),
+}
+PASSWORD = "testpass123"  # seed_data.PASSWORD
+PERCENTILES = (95, 99)
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    work_dir = tempfile.mkdtemp(prefix="pv-bench-")
+    args = [f"--{name}={count}" for name, count in VOLUMES.items()]
+    # users: test_operator (Operator), user1 (SiteManager), user2 (PM), user3 (Admin)
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "seed_data.py"), "--users=4", "--seed=1", *args], cwd=work_dir, check=True, capture_output=True)
+    # The app opens ./pvdb.db on import; .benchmarks/ was already resolved
+    # against the original directory, so saved runs stay in backend/
+    os.chdir(work_dir)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    import app.routers.materials as materials
+
+    async def stub_ocr(contents: bytes) -> str:
+        # Stand-in for Tesseract: a distinct, parseable delivery note per image
+        return f"DDT: OCR{hashlib.sha256(contents).hexdigest()[:12]}\nBATCH: B42\nPanels x 36"
+
+    materials.run_ocr = stub_ocr
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _login(client, username: str) -> dict:
+    r = client.post("/auth/login", json={"username": username, "password": PASSWORD})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def operator(client):
+    return _login(client, "test_operator")
+
+
+@pytest.fixture(scope="session")
+def pm(client):
+    return _login(client, "user2")
+
+
+@pytest.fixture
+def sql_statements(client):
+    """List that collects every SQL statement the app executes during the test."""
+    from sqlalchemy import event
+    from app.database import async_engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def _percentile(data, p: float) -> float:
+    # Nearest-rank: a time some round actually took
+    ordered = sorted(data)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _measured(config) -> list:
+    session = getattr(config, "_benchmarksession", None)
+    return [bench for bench in (session.benchmarks if session else []) if bench and not bench.has_error]
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    tails = {bench.fullname: bench for bench in benchmarks if bench and not bench.has_error}
+    for entry in output_json["benchmarks"]:
+        bench = tails.get(entry["fullname"])
+        if bench is not None:
+            entry["stats"].update({f"p{p}": _percentile(bench.stats.data, p) for p in PERCENTILES})
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_terminal_summary(terminalreporter, config):
+    benchmarks = sorted(_measured(config), key=lambda bench: bench.name)
+    if not benchmarks:
+        return
+    width = max(len(bench.name) for bench in benchmarks)
+    headings = ["median"] + [f"p{p}" for p in PERCENTILES]
+    terminalreporter.write_sep("-", "tail latency (ms)")
+    terminalreporter.write_line(f"{'Name':<{width}}  " + "  ".join(f"{h:>10}" for h in headings) + f"  {'rounds':>8}")
+    for bench in benchmarks:
+        data = bench.stats.data
+        values = [bench.stats.median] + [_percentile(data, p) for p in PERCENTILES]
+        terminalreporter.write_line(f"{bench.name:<{width}}  " + "  ".join(f"{v * 1000:>10.3f}" for v in values) + f"  {len(data):>8}")
@@ -0,0 +1,96 @@
+"""OCR pipeline latency and extraction accuracy over a corpus of scans.
+
+Run from the backend directory:
+
+    python benchmarks/ocr_pipeline.py path/to/corpus
+    python benchmarks/ocr_pipeline.py path/to/corpus --synthesize 10
+
+The corpus is a directory of .png/.jpg/.jpeg/.pdf delivery notes. Each scan
+may have a sidecar <name>.json with the expected values, for example
+{"ddt_number": "12345", "batch_number": "B77"}; scans without one only count
+towards latency. --synthesize first writes N phone-sized synthetic notes
+(with sidecars) into the directory so the benchmark runs without real data.
+
+Each scan is OCR'd in-process twice: once "raw" (no preprocessing, as
+before the pipeline existed) and once with the configured pipeline
+(OCR_PREPROCESS, OCR_TARGET_DPI).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCAN_EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf")
+
+
+def synthesize(corpus: str, count: int):
+    from PIL import Image, ImageDraw, ImageFont
+
+    os.makedirs(corpus, exist_ok=True)
+    font = ImageFont.load_default(size=90)
+    for i in range(count):
+        ddt, batch = f"{random.randint(10000, 99999)}", f"B{random.randint(100, 999)}"
+        # 12 MP, roughly what a site phone produces
+        image = Image.new("RGB", (3000, 4000), (235, 232, 225))
+        draw = ImageDraw.Draw(image)
+        draw.text((200, 250), f"DDT: {ddt}", fill=(20, 20, 20), font=font)
+        draw.text((200, 400), f"BATCH: {batch}", fill=(20, 20, 20), font=font)
+        for line in range(20):
+            draw.text((200, 900 + line * 130), f"PV module 550W x {random.randint(1, 40)}  pallet {line}", fill=(40, 40, 40), font=font)
+        name = f"synthetic_{i:03d}"
+        image.save(os.path.join(corpus, f"{name}.jpg"), quality=90)
+        with open(os.path.join(corpus, f"{name}.json"), "w") as f:
+            json.dump({"ddt_number": ddt, "batch_number": batch}, f)
+
+
+def run_mode(ocr, scans, preprocess: bool):
+    ocr.OCR_PREPROCESS = preprocess
+    per_page, fields_total, fields_correct = [], 0, 0
+    for path, expected in scans:
+        with open(path, "rb") as f:
+            contents = f.read()
+        start = time.perf_counter()
+        text, pages = ocr.ocr_document(contents)
+        per_page.append((time.perf_counter() - start) / max(pages, 1))
+        parsed = ocr.parse_ocr_text(text)
+        for field, value in (expected or {}).items():
+            fields_total += 1
+            fields_correct += parsed.get(field) == value
+    return per_page, fields_total, fields_correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus")
+    parser.add_argument("--synthesize", type=int, default=0, metavar="N")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import ocr
+
+    if args.synthesize:
+        synthesize(args.corpus, args.synthesize)
+
+    scans = []
+    for name in sorted(os.listdir(args.corpus)):
+        if name.lower().endswith(SCAN_EXTENSIONS):
+            sidecar = os.path.join(args.corpus, os.path.splitext(name)[0] + ".json")
+            expected = json.load(open(sidecar)) if os.path.exists(sidecar) else None
+            scans.append((os.path.join(args.corpus, name), expected))
+    if not scans:
+        sys.exit(f"No scans found in {args.corpus}")
+
+    print(f"{len(scans)} scans, target {ocr.OCR_TARGET_DPI} DPI")
+    print(f"{'mode':<10}{'p50 ms/page':>14}{'mean ms/page':>14}{'accuracy':>12}")
+    for mode, preprocess in (("raw", False), ("pipeline", ocr.OCR_PREPROCESS)):
+        per_page, total, correct = run_mode(ocr, scans, preprocess)
+        accuracy = f"{correct}/{total}" if total else "n/a"
+        print(f"{mode:<10}{statistics.median(per_page) * 1000:>14.1f}{statistics.mean(per_page) * 1000:>14.1f}{accuracy:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Worker startup time: importing app.main in a fresh interpreter.
+
+Run from the backend directory:
+
+    python benchmarks/startup.py                      # median of 5 runs + slowest imports
+    python benchmarks/startup.py --runs 10 --json startup.json
+
+Each run is a new `python -X importtime` process in a scratch directory, so
+nothing is cached between runs except the OS page cache and .pyc files (one
+warm-up run is discarded). Also reported: the migration check every worker
+runs at startup against an up-to-date database. --json writes the results for
+diffing between commits; bench_startup.py tracks the same numbers with
+pytest-benchmark.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys, time
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+app.main.migrate()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def run_once(work_dir: str) -> tuple:
+    """Returns (import seconds, migration check seconds, {module: cumulative seconds})."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(backend=BACKEND_DIR)],
+        cwd=work_dir, check=True, capture_output=True, text=True,
+    )
+    import_seconds, migrate_seconds = map(float, result.stdout.split())
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+    return import_seconds, migrate_seconds, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="pv-startup-")
+    run_once(work_dir)  # warm-up: writes .pyc files and creates the database
+    runs = [run_once(work_dir) for _ in range(args.runs)]
+    median_run = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    app_modules = {name: seconds for name, seconds in median_run[2].items() if name.startswith("app.")}
+    results = {
+        "runs": args.runs,
+        "import_median_ms": round(statistics.median(run[0] for run in runs) * 1000, 1),
+        "import_min_ms": round(min(run[0] for run in runs) * 1000, 1),
+        "migration_check_median_ms": round(statistics.median(run[1] for run in runs) * 1000, 1),
+        "slowest_imports_ms": {
+            name: round(seconds * 1000, 1)
+            for name, seconds in sorted(median_run[2].items(), key=lambda item: -item[1])[:args.top]
+        },
+        "app_modules_ms": {name: round(seconds * 1000, 1) for name, seconds in sorted(app_modules.items())},
+    }
+
+    print(f"import app.main: median {results['import_median_ms']} ms, min {results['import_min_ms']} ms ({args.runs} runs)")
+    print(f"migration check: median {results['migration_check_median_ms']} ms")
+    print("slowest imports (cumulative ms, median run):")
+    for name, ms in results["slowest_imports_ms"].items():
+        print(f"  {ms:>8.1f}  {name}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
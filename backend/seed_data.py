@@ -1,47 +1,206 @@
+"""Synthetic data generator.
+
+Run from the backend directory:
+
+    python seed_data.py                                   # demo data, login test_operator / testpass123
+    python seed_data.py --logs 1000000 --materials 200000 --documents 200000 --kpis 500
+
+Rows are inserted with executemany in batches of --batch-size inside one
+transaction per batch, so millions of rows take minutes rather than hours.
+--seed makes runs reproducible (dates are relative to today).
+"""
 import sys
 sys.path.insert(0, r'E:\pv-clean\backend')
 
-from app.database import SessionLocal
-from app.models import User, DailyLog, Material
-from app.routers.auth import get_password_hash
-
-db = SessionLocal()
-
-# Create or update test user
-user = db.query(User).filter(User.username == 'test_operator').first()
-if not user:
-    hashed = get_password_hash('testpass123')
-    user = User(username='test_operator', hashed_password=hashed, role='Operator')
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    print("Created test user 'test_operator'")
-
-# Add sample log
-log = DailyLog(
-    workers_count=25,
-    tasks='["Test log"]',
-    hours_worked=8.0,
-    equipment_used='Crane',
-    fuel_consumed=50.0,
-    user_id=user.id
-)
-db.add(log)
-db.commit()
-print("Added sample log")
-
-# Add sample material
-material = Material(
-    ddt_number='DDT-TEST',
-    packing_list='["Panels x100"]',
-    container_id='CONT-123',
-    batch_number='BATCH-PV56',
-    non_conformity=False,
-    notes='Test material'
-)
-db.add(material)
-db.commit()
-print("Added sample material")
-
-db.close()
-print("Seeding complete! Login with test_operator / testpass123")
\ No newline at end of file
+import argparse
+import io
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, update
+
+from app.database import engine
+from app.migrations import migrate
+from app.models import User, DailyLog, DailyLogRollup, Material, ProjectProgress, ProgressSummary, Document, Blob
+from app.storage import storage
+from app.sync import SYNCED_TABLES, next_version
+
+ROLES = ["Operator", "SiteManager", "PM", "Admin"]
+TASKS = ["Pile driving", "Tracker assembly", "Module mounting", "DC cabling", "Inverter installation", "Trenching", "Fencing", "Commissioning tests"]
+EQUIPMENT = ["Crane", "Pile driver", "Excavator", "Telehandler", "Trencher", "Forklift"]
+SUPPLIERS = ["Jinko", "LONGi", "Trina", "Huawei", "SMA", "Nextracker"]
+PASSWORD = "testpass123"
+
+def log(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+def insert_batch(table, batch: list):
+    with engine.begin() as conn:
+        if table.name in SYNCED_TABLES:
+            next_version(conn)  # stamped on the rows by the row_version column default
+        conn.execute(insert(table), batch)
+
+def insert_batches(table, rows, batch_size: int, label: str):
+    """Insert an iterable of row dicts in executemany batches; returns the row count."""
+    total, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            insert_batch(table, batch)
+            total += len(batch)
+            batch = []
+            log(f"  {label}: {total}")
+    if batch:
+        insert_batch(table, batch)
+        total += len(batch)
+    return total
+
+def seed_users(count: int) -> list:
+    from app.routers.auth import get_password_hash
+    hashed = get_password_hash(PASSWORD)  # one hash for every synthetic user
+    with engine.begin() as conn:
+        existing = dict(conn.execute(select(User.username, User.id)).all())
+        new_users = [
+            {"username": name, "hashed_password": hashed, "role": role}
+            for name, role in [("test_operator", "Operator")] + [(f"user{i}", ROLES[i % len(ROLES)]) for i in range(1, count)]
+            if name not in existing
+        ]
+        if new_users:
+            conn.execute(insert(User.__table__), new_users)
+        return list(conn.execute(select(User.id)).scalars())
+
+def daily_logs(count: int, user_ids: list, start: datetime, days: int):
+    for _ in range(count):
+        yield {
+            "date": start + timedelta(days=random.randrange(days), minutes=random.randrange(6 * 60, 18 * 60)),
+            "workers_count": random.randint(2, 80),
+            "tasks": f"{random.choice(TASKS)} block {random.randint(1, 56)} row {random.randint(1, 400)}",
+            "hours_worked": random.choice([4.0, 6.0, 8.0, 8.0, 8.0, 10.0]),
+            "equipment_used": ", ".join(random.sample(EQUIPMENT, random.randint(1, 3))),
+            "fuel_consumed": round(random.uniform(0, 250), 1),
+            "user_id": random.choice(user_ids),
+        }
+
+def materials(count: int, offset: int, start: datetime, days: int):
+    for i in range(offset, offset + count):
+        supplier = random.choice(SUPPLIERS)
+        yield {
+            "ddt_number": f"SEED{i:08d}",
+            "packing_list": "\n".join(f"{supplier} item {j}: {random.randint(1, 500)} pcs" for j in range(random.randint(1, 20))),
+            "container_id": f"MSCU{random.randint(1000000, 9999999)}",
+            "batch_number": f"B{random.randint(100, 999)}",
+            "non_conformity": random.random() < 0.03,
+            "notes": f"Delivered by {supplier}",
+            "created_at": start + timedelta(days=random.randrange(days), seconds=random.randrange(86400)),
+        }
+
+def write_blobs(count: int) -> list:
+    # A handful of real files shared by every synthetic document, as
+    # deduplicated uploads would be, so content and thumbnail endpoints work.
+    # Every fourth is a one-page PDF (scanned delivery note), the rest JPEGs.
+    from PIL import Image
+    import hashlib
+    blobs = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        file_type = "pdf" if i % 4 == 3 else "photo"
+        image = Image.new("RGB", (1600, 1200), (40 * i % 256, 120, 200 - 20 * i % 200))
+        if file_type == "pdf":
+            image.save(buffer, "PDF", resolution=150)
+        else:
+            image.save(buffer, "JPEG", quality=70)
+        data = buffer.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        path = storage.local_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        blobs.append((digest, len(data), path.replace(os.sep, "/"), file_type))
+    return blobs
+
+def documents(count: int, blobs: list, material_range: tuple, log_range: tuple, start: datetime, days: int):
+    for i in range(count):
+        # file_type follows the bytes, as on upload (documents.py)
+        digest, size, path, file_type = blobs[i % len(blobs)]
+        on_material = random.random() < 0.7 or not log_range[1]
+        yield {
+            "file_path": path,
+            "file_type": file_type,
+            "content_hash": digest,
+            "size": size,
+            "original_filename": f"IMG_{i:07d}.jpg" if file_type == "photo" else f"DDT_{i:07d}.pdf",
+            "material_id": random.randint(*material_range) if on_material and material_range[1] else None,
+            "log_id": random.randint(*log_range) if not on_material and log_range[1] else None,
+            "created_at": start + timedelta(days=random.randrange(days), seconds=random.randrange(86400)),
+        }
+
+def kpis(count: int, start: datetime, days: int):
+    for i in range(count):
+        target = start + timedelta(days=random.randrange(days))
+        done = random.random() < 0.6
+        yield {
+            "kpi_name": f"{random.choice(TASKS)} block {i + 1}",
+            "progress_percent": 100.0 if done else round(random.uniform(0, 95), 1),
+            "target_date": target,
+            "actual_date": target + timedelta(days=random.randint(-20, 30)) if done else None,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic site data")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--logs", type=int, default=1)
+    parser.add_argument("--materials", type=int, default=1)
+    parser.add_argument("--documents", type=int, default=0)
+    parser.add_argument("--kpis", type=int, default=0)
+    parser.add_argument("--blobs", type=int, default=8, help="distinct files shared by the documents (JPEGs, every fourth a PDF)")
+    parser.add_argument("--days", type=int, default=730, help="spread dates over this many days before today")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    migrate()
+    start = datetime.utcnow() - timedelta(days=args.days)
+    began = time.perf_counter()
+
+    user_ids = seed_users(max(args.users, 1))
+    log(f"users: {len(user_ids)} (password {PASSWORD})")
+
+    with engine.begin() as conn:
+        first_log = (conn.scalar(select(func.max(DailyLog.id))) or 0) + 1
+        first_material = (conn.scalar(select(func.max(Material.id))) or 0) + 1
+        material_offset = conn.scalar(select(func.count()).select_from(Material))
+    n = insert_batches(DailyLog.__table__, daily_logs(args.logs, user_ids, start, args.days), args.batch_size, "logs")
+    log(f"daily logs: {n}")
+    n = insert_batches(Material.__table__, materials(args.materials, material_offset, start, args.days), args.batch_size, "materials")
+    log(f"materials: {n}")
+
+    if args.documents:
+        blobs = write_blobs(args.blobs)
+        with engine.begin() as conn:
+            for digest, size, _, _ in blobs:
+                if conn.scalar(select(Blob.digest).where(Blob.digest == digest)) is None:
+                    conn.execute(insert(Blob), {"digest": digest, "size": size, "refcount": 0})
+            last_log = conn.scalar(select(func.max(DailyLog.id))) or 0
+            last_material = conn.scalar(select(func.max(Material.id))) or 0
+        n = insert_batches(Document.__table__, documents(
+            args.documents, blobs, (min(first_material, last_material), last_material), (min(first_log, last_log), last_log), start, args.days
+        ), args.batch_size, "documents")
+        with engine.begin() as conn:
+            for digest, _, _, _ in blobs:
+                refcount = select(func.count()).select_from(Document).where(Document.content_hash == digest).scalar_subquery()
+                conn.execute(update(Blob).where(Blob.digest == digest).values(refcount=refcount))
+        log(f"documents: {n}")
+
+    n = insert_batches(ProjectProgress.__table__, kpis(args.kpis, start, args.days + 180), args.batch_size, "kpis")
+    log(f"kpis: {n}")
+
+    # Derived tables are rebuilt from the raw rows on their next read
+    with engine.begin() as conn:
+        conn.execute(delete(DailyLogRollup))
+        conn.execute(delete(ProgressSummary))
+    log(f"Seeding complete in {time.perf_counter() - began:.1f}s! Login with test_operator / {PASSWORD}")
+
+if __name__ == "__main__":
+    main()
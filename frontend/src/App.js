@@ -123,26 +123,62 @@
     const [error, setError] = useState('');
 
     useEffect(() => {
-      const fetchData = async () => {
+      const fetchData = async (showSpinner = true) => {
         try {
-          setLoading(true);
-          const [logsRes, materialsRes, progressRes, documentsRes] = await Promise.all([
-            api.get('/logs/'),
-            api.get('/materials/'),
-            api.get('/progress/'),
-            api.get('/documents/')
-          ]);
-          setLogs(logsRes.data);
-          setMaterials(materialsRes.data);
-          setProgress(progressRes.data);
-          setDocuments(documentsRes.data);
+          if (showSpinner) setLoading(true);
+          // One aggregated, server-cached payload instead of four list calls
+          const { data } = await api.get('/dashboard');
+          setLogs(data.logs);
+          setMaterials(data.materials);
+          setProgress(data.progress);
+          setDocuments(data.documents);
         } catch (err) {
           setError('Failed to fetch data');
         } finally {
-          setLoading(false);
+          if (showSpinner) setLoading(false);
         }
       };
       fetchData();
+
+      // Live updates: refetch (debounced, no spinner) when the server reports changes
+      // instead of polling. EventSource can't send headers, so the stream is opened
+      // with a short-lived stream token rather than the access token; every
+      // (re)connect asks for a fresh one and resumes after the last event seen.
+      let refetchTimer;
+      let reconnectTimer;
+      let source;
+      let lastEventId = '';
+      let closed = false;
+      const scheduleRefetch = (event) => {
+        if (event.lastEventId) lastEventId = event.lastEventId;
+        clearTimeout(refetchTimer);
+        refetchTimer = setTimeout(() => fetchData(false), 300);
+      };
+      const connect = async () => {
+        try {
+          const { data } = await api.post('/events/token');
+          if (closed) return;
+          const resume = lastEventId ? `&last_event_id=${encodeURIComponent(lastEventId)}` : '';
+          source = new EventSource(`${API_BASE}/events?stream_token=${encodeURIComponent(data.stream_token)}${resume}`);
+          source.addEventListener('change', scheduleRefetch);
+          source.addEventListener('reset', scheduleRefetch);
+          source.onerror = () => {
+            // The stream token has expired by now, so don't let EventSource retry with it
+            source.close();
+            if (!closed) reconnectTimer = setTimeout(connect, 3000);
+          };
+        } catch (err) {
+          // Logged out or the access token expired: no live updates until the next login
+          if (!closed && err.response?.status !== 401) reconnectTimer = setTimeout(connect, 3000);
+        }
+      };
+      connect();
+      return () => {
+        closed = true;
+        clearTimeout(refetchTimer);
+        clearTimeout(reconnectTimer);
+        if (source) source.close();
+      };
     }, []);
 
     const handleTabChange = (event, newValue) => {